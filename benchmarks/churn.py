@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding: utf-8
+""" Connection churn: opens client/server Context pairs, exchanges one
+    request and response, closes them, and reports the process RSS after
+    every round. A flat RSS means zlib state is freed along with the
+    Contexts (the ctypes backend allocates it outside Python's allocator).
+
+    Usage: python benchmarks/churn.py [rounds] [connections per round]
+"""
+import gc
+import os
+import sys
+from timeit import default_timer as timer
+from spdy.compression import HAVE_ZDICT
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, SynReply, DataFrame, Ping
+
+def rss_kib():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+def exchange(client, server):
+    client.put_frame(SynStream(client.next_stream_id,
+                               {':method': 'GET', ':path': '/', ':version': 'HTTP/1.1',
+                                ':host': 'www.example.com', ':scheme': 'https'}))
+    server.incoming(client.outgoing())
+    for frame in server.get_frames():
+        server.put_frame(SynReply(frame.stream_id, {':status': '200 OK',
+                                                    ':version': 'HTTP/1.1'}, flags=0))
+        server.put_frame(DataFrame(frame.stream_id, b'hello, world!'))
+    client.incoming(server.outgoing())
+    client.get_frames()
+
+def ping_only(client, server):
+    client.put_frame(Ping(client.next_ping_id))
+    server.incoming(client.outgoing())
+    server.get_frames()
+
+def churn(backend, workload, close, rounds, connections):
+    start = timer()
+    rss = []
+    for _ in range(rounds):
+        for _ in range(connections):
+            client = Context(CLIENT, compression=backend)
+            server = Context(SERVER, compression=backend)
+            workload(client, server)
+            if close:
+                client.close()
+                server.close()
+        gc.collect()
+        rss.append(rss_kib())
+    elapsed = timer() - start
+    print('%-6s %-9s %-8s %7.1f us/connection  RSS KiB by round: %s' % (
+          backend, workload.__name__, 'close()' if close else 'gc',
+          elapsed * 1e6 / (rounds * connections),
+          ' '.join(str(kib) for kib in rss)))
+
+def main(rounds, connections):
+    backends = ['ctypes']
+    if HAVE_ZDICT:
+        backends.insert(0, 'zlib')
+    for backend in backends:
+        for workload in (exchange, ping_only):
+            for close in (True, False):
+                churn(backend, workload, close, rounds, connections)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# coding: utf-8
+""" Request latency with a new TLS session per request, like
+    examples/spdyclient_v3.py, and with spdy.client.SessionPool reusing
+    one warm session per origin. The server (spdy.server, with the
+    examples/ certificate) runs in a child process on loopback.
+
+    Usage: python benchmarks/client_pool.py [requests]
+"""
+import asyncio
+import multiprocessing
+import os
+import ssl
+import sys
+from timeit import default_timer as timer
+from spdy.aio import connect
+from spdy.client import SessionPool
+from spdy.server import SpdyServer
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+REQUEST_HEADERS = {':method': 'GET', ':path': '/', ':version': 'HTTP/1.1',
+                   ':host': 'localhost', ':scheme': 'https'}
+
+def server_ssl():
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    #the example certificate has a 1024 bit key
+    context.set_ciphers('DEFAULT:@SECLEVEL=0')
+    context.load_cert_chain(os.path.join(EXAMPLES, 'server.crt'),
+                            os.path.join(EXAMPLES, 'server.key'))
+    return context
+
+def client_ssl():
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    context.set_ciphers('DEFAULT:@SECLEVEL=0')
+    return context
+
+def run_server(port, ready):
+    def handler(headers, body):
+        return {':status': '200 OK', ':version': 'HTTP/1.1'}, b'hello, world!'
+
+    async def main():
+        server = await SpdyServer(handler, ssl=server_ssl()).start('127.0.0.1', port.value)
+        port.value = server.sockets[0].getsockname()[1]
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+async def new_session_per_request(port, requests):
+    latencies = []
+    for _ in range(requests):
+        start = timer()
+        protocol = await connect('127.0.0.1', port, ssl=client_ssl())
+        stream = protocol.open_stream(REQUEST_HEADERS, fin=True)
+        await stream.response()
+        await stream.read()
+        latencies.append(timer() - start)
+        protocol.close()
+    return latencies
+
+async def pooled(port, requests):
+    pool = SessionPool(ssl=client_ssl())
+    #warm-up: TCP and TLS handshakes
+    await pool.request('127.0.0.1', port, REQUEST_HEADERS)
+    latencies = []
+    for _ in range(requests):
+        start = timer()
+        await pool.request('127.0.0.1', port, REQUEST_HEADERS)
+        latencies.append(timer() - start)
+    pool.close()
+    return latencies
+
+def report(name, latencies):
+    latencies.sort()
+    print('%-24s p50 %6.2f ms, p99 %6.2f ms' % (
+          name, latencies[len(latencies) // 2] * 1000,
+          latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000))
+
+def main(requests):
+    port = multiprocessing.Value('i', 0)
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server, args=(port, ready))
+    server.start()
+    try:
+        ready.wait()
+        report('new session per request', asyncio.run(new_session_per_request(port.value,
+                                                                              requests)))
+        report('SessionPool', asyncio.run(pooled(port.value, requests)))
+    finally:
+        server.terminate()
+        server.join()
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# coding: utf-8
+""" Encode and decode throughput, per frame type and SPDY version, plus
+    header block compression per backend. Frames are encoded with
+    Context._encode_frame() and decoded with Context._parse_frame(), a
+    session's worth at a time (the zlib streams are per session); name/value
+    frames carry the browser and server header sets of compression.py, with
+    fixed seeds, and decoding includes reading their headers. Sessions are
+    timed in groups lasting at least 50 ms; the whole suite runs `repeat`
+    times, so a slow spell of the machine hits a case at most once, and
+    each case reports its best group.
+
+    Usage: python benchmarks/codec.py [--frames N] [--repeat N] [--save FILE]
+                                      [--compare BASELINE] [--threshold FRACTION]
+
+    --save writes the results as JSON; --compare runs the suite and flags
+    every case whose frames/s dropped by more than threshold (10% by default)
+    from BASELINE, a file written by --save. It exits with status 1 then.
+    Baseline and comparison should come from the same idle machine; on a
+    shared one, raise --repeat and --threshold.
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+from functools import partial
+from timeit import default_timer as timer
+from compression import request_headers, response_headers, header_blocks
+from spdy.compression import get_backend, HAVE_ZDICT
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, SynReply, RstStream, Settings, Ping, Goaway, \
+                        Headers, WindowUpdate, DataFrame, VERSIONS, \
+                        INITIAL_WINDOW_SIZE, MAX_CONCURRENT_STREAMS, PERSIST_NONE
+
+def frame_cases(version, count, seed=1):
+    """ Returns (name, side, frames) tuples, `count` frames each """
+    rnd = random.Random(seed)
+    ids = range(1, 2 * count, 2)
+    cases = [
+        ('SynStream', CLIENT, [SynStream(i, request_headers(version, rnd, n), priority=n % 4,
+                                         version=version)
+                               for n, i in enumerate(ids)]),
+        ('SynReply', SERVER, [SynReply(i, response_headers(version, rnd, n), flags=0,
+                                       version=version)
+                              for n, i in enumerate(ids)]),
+        ('Headers', SERVER, [Headers(i, {'x-request-id': '%08x' % rnd.getrandbits(32)},
+                                     version=version)
+                             for i in ids]),
+        ('RstStream', CLIENT, [RstStream(i, 5, version=version) for i in ids]),
+        ('Settings', SERVER, [Settings(2, {INITIAL_WINDOW_SIZE: (PERSIST_NONE, 65536),
+                                           MAX_CONCURRENT_STREAMS: (PERSIST_NONE, 100)},
+                                       version=version)
+                              for _ in ids]),
+        ('Ping', CLIENT, [Ping(i, version=version) for i in ids]),
+        ('Goaway', SERVER, [Goaway(i, 0 if version >= 3 else None, version=version)
+                            for i in ids]),
+        ('Data-1KiB', SERVER, [DataFrame(i, _payload(rnd, 1024), 0) for i in ids]),
+        ('Data-16KiB', SERVER, [DataFrame(i, _payload(rnd, 16384), 0) for i in ids]),
+    ]
+    if version >= 3:
+        cases.append(('WindowUpdate', CLIENT, [WindowUpdate(i, 32768, version=version)
+                                               for i in ids]))
+    return cases
+
+def _payload(rnd, size):
+    return bytes(bytearray(rnd.getrandbits(8) for _ in range(size)))
+
+# Shortest group of runs timed together, see calibrate()
+MIN_TIME = 0.05
+
+def calibrate(run, min_time=MIN_TIME):
+    """ Returns how many calls to run() (which returns the seconds it
+        measured) take at least min_time """
+    number = 1
+    while sum(run() for _ in range(number)) < min_time:
+        number *= 2
+    return number
+
+def encode(side, version, frames):
+    ctx = Context(side, version=version)
+    start = timer()
+    for frame in frames:
+        ctx._encode_frame(frame)
+    return timer() - start
+
+def wire_bytes(side, version, frames):
+    ctx = Context(side, version=version)
+    return b''.join(bytes(ctx._encode_frame(frame)) for frame in frames)
+
+def decode(side, version, wire, count):
+    ctx = Context(SERVER if side == CLIENT else CLIENT, version=version)
+    start = timer()
+    offset = 0
+    parsed = 0
+    while True:
+        frame, length = ctx._parse_frame(wire, offset)
+        if not length:
+            break
+        #name/value blocks are only decoded when asked for
+        getattr(frame, 'headers', None)
+        offset += length
+        parsed += 1
+    elapsed = timer() - start
+    assert parsed == count, (parsed, count)
+    return elapsed
+
+def compress(backend, version, blocks):
+    deflater = get_backend(backend)[1](version)
+    start = timer()
+    for block in blocks:
+        deflater.compress(block)
+    elapsed = timer() - start
+    deflater.close()
+    return elapsed
+
+def decompress(backend, version, compressed):
+    inflater = get_backend(backend)[0](version)
+    start = timer()
+    for block in compressed:
+        inflater.decompress(block)
+    elapsed = timer() - start
+    inflater.close()
+    return elapsed
+
+def _result(count, size, seconds):
+    return {'frames_per_s': count / seconds, 'mb_per_s': size / seconds / 1e6}
+
+def run(count, repeat):
+    #like timeit, keep the collector from firing at random inside the cases
+    gc.disable()
+    try:
+        return _run(count, repeat)
+    finally:
+        gc.enable()
+
+def cases(count):
+    """ Returns (case name, run, frames, bytes) tuples """
+    cases = []
+    for version in VERSIONS:
+        for name, side, frames in frame_cases(version, count):
+            wire = wire_bytes(side, version, frames)
+            cases.append(('spdy%d/%s/encode' % (version, name),
+                          partial(encode, side, version, frames), count, len(wire)))
+            cases.append(('spdy%d/%s/decode' % (version, name),
+                          partial(decode, side, version, wire, count), count, len(wire)))
+
+        blocks = header_blocks(version, count // 2)
+        size = sum(len(block) for block in blocks)
+        for backend in (['zlib'] if HAVE_ZDICT else []) + ['ctypes']:
+            deflater = get_backend(backend)[1](version)
+            compressed = [bytes(deflater.compress(block)) for block in blocks]
+            deflater.close()
+            #MB/s of uncompressed header blocks, both ways
+            cases.append(('spdy%d/headers-%s/compress' % (version, backend),
+                          partial(compress, backend, version, blocks), len(blocks), size))
+            cases.append(('spdy%d/headers-%s/decompress' % (version, backend),
+                          partial(decompress, backend, version, compressed), len(blocks), size))
+    return cases
+
+def _run(count, repeat):
+    suite = [(name, run, calibrate(run), frames, size)
+             for name, run, frames, size in cases(count)]
+    best = {}
+    for _ in range(repeat):
+        for name, run, number, frames, size in suite:
+            seconds = sum(run() for _ in range(number)) / number
+            best[name] = min(best.get(name, seconds), seconds)
+    return dict((name, _result(frames, size, best[name]))
+                for name, run, number, frames, size in suite)
+
+def compare(results, baseline, threshold):
+    """ Prints every case next to the baseline, returns the regressions """
+    regressions = []
+    for case in sorted(results):
+        rate = results[case]['frames_per_s']
+        if case not in baseline:
+            print('%-36s %12.0f frames/s  (new)' % (case, rate))
+            continue
+        change = rate / baseline[case]['frames_per_s'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressions.append(case)
+        print('%-36s %12.0f frames/s  %+6.1f%%%s' % (case, rate, change * 100, flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='SPDY codec benchmarks')
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', metavar='FILE')
+    parser.add_argument('--compare', metavar='BASELINE')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args()
+
+    results = run(args.frames, args.repeat)
+    if args.save:
+        with open(args.save, 'w') as out:
+            json.dump({'python': platform.python_version(),
+                       'implementation': platform.python_implementation(),
+                       'machine': platform.machine(),
+                       'frames': args.frames,
+                       'results': results}, out, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('%d regressions over %d%%' % (len(regressions), args.threshold * 100))
+            sys.exit(1)
+        return
+
+    for case in sorted(results):
+        print('%-36s %12.0f frames/s %9.1f MB/s' % (case, results[case]['frames_per_s'],
+                                                    results[case]['mb_per_s']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# coding: utf-8
+""" Header compression backends compared on a session's worth of SPDY/2 and
+    SPDY/3 request and response header blocks, and zlib memory per
+    connection for each of the compression presets.
+
+    Usage: python benchmarks/compression.py [requests]
+           python benchmarks/compression.py presets [connections]
+"""
+import random
+import sys
+import tracemalloc
+from timeit import default_timer as timer
+from spdy.compression import get_backend, HAVE_ZDICT, PRESETS
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, SynReply, FLAG_FIN
+
+def request_headers(version, rnd, i):
+    path = '/static/%s/%08x.%s' % (rnd.choice(['css', 'js', 'img']),
+                                   rnd.getrandbits(32),
+                                   rnd.choice(['css', 'js', 'png']))
+    headers = {
+        'method': 'GET',
+        'url': path,
+        'version': 'HTTP/1.1',
+        'host': 'www.example.com',
+        'scheme': 'https',
+        'user-agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:24.0) Gecko/20100101 Firefox/24.0',
+        'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'accept-language': 'en-US,en;q=0.5',
+        'accept-encoding': 'gzip, deflate',
+        'cookie': 'session=%016x; prefs=%d' % (rnd.getrandbits(64), i % 7),
+        'referer': 'https://www.example.com/',
+    }
+    return _for_version(version, headers, {'method': ':method', 'url': ':path',
+                                           'version': ':version', 'host': ':host',
+                                           'scheme': ':scheme'})
+
+def response_headers(version, rnd, i):
+    headers = {
+        'status': '200 OK',
+        'version': 'HTTP/1.1',
+        'content-type': rnd.choice(['text/css', 'application/javascript', 'image/png']),
+        'content-length': str(rnd.randint(200, 200000)),
+        'cache-control': 'public, max-age=31536000',
+        'date': 'Tue, 15 Oct 2013 12:%02d:%02d GMT' % (i // 60 % 60, i % 60),
+        'last-modified': 'Mon, 07 Oct 2013 08:00:00 GMT',
+        'etag': '"%08x"' % rnd.getrandbits(32),
+        'server': 'python-spdy',
+    }
+    return _for_version(version, headers, {'status': ':status', 'version': ':version'})
+
+def _for_version(version, headers, v3_names):
+    if version == 2:
+        return headers
+    return dict((v3_names.get(name, name), value) for name, value in headers.items())
+
+def header_blocks(version, requests, seed=1):
+    """ Uncompressed n/v blocks, alternating request and response """
+    rnd = random.Random(seed)
+    encoder = Context(CLIENT, version=version)
+    blocks = []
+    for i in range(requests):
+        for headers in (request_headers(version, rnd, i),
+                        response_headers(version, rnd, i)):
+            blocks.append(_uncompressed_block(encoder, headers, version))
+    return blocks
+
+def _uncompressed_block(ctx, headers, version):
+    compressed = ctx._encode_header_chunk(headers, version)
+    return bytes(ctx._parse_header_chunk(compressed, version).data)
+
+def run(backend, version, blocks):
+    inflater_cls, deflater_cls = get_backend(backend)
+    deflater = deflater_cls(version)
+    start = timer()
+    compressed = [deflater.compress(block) for block in blocks]
+    compress_time = timer() - start
+
+    inflater = inflater_cls(version)
+    start = timer()
+    for block in compressed:
+        inflater.decompress(block)
+    decompress_time = timer() - start
+
+    raw_size = sum(len(block) for block in blocks)
+    compressed_size = sum(len(block) for block in compressed)
+    print('spdy/%i %-6s compress %6.2f us/block  decompress %6.2f us/block  '
+          'ratio %.3f' % (version, backend,
+                          compress_time * 1e6 / len(blocks),
+                          decompress_time * 1e6 / len(blocks),
+                          float(compressed_size) / raw_size))
+
+def presets(connections, requests=50):
+    """ Per connection memory, zlib state included (the stdlib backend
+        allocates it through the Python allocator), after exchanging
+        `requests` request/response header sets; and compression ratio """
+    for version in (2, 3):
+        rnd = random.Random(1)
+        exchange = [(request_headers(version, rnd, i), response_headers(version, rnd, i))
+                    for i in range(requests)]
+        blocks = header_blocks(version, requests)
+        raw_size = sum(len(block) for block in blocks)
+        for name in ('default', 'balanced', 'small', 'tiny'):
+            options = PRESETS[name]
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            pairs = []
+            for _ in range(connections):
+                client = Context(CLIENT, version=version, compression='zlib', **options)
+                server = Context(SERVER, version=version, compression='zlib', **options)
+                for i, (request, response) in enumerate(exchange):
+                    client.put_frame(SynStream(2 * i + 1, request, version=version))
+                    server.incoming(client.outgoing())
+                    server.get_frames()
+                    #closes the stream: only the zlib state stays per connection
+                    server.put_frame(SynReply(2 * i + 1, response, flags=FLAG_FIN,
+                                              version=version))
+                    client.incoming(server.outgoing())
+                    client.get_frames()
+                pairs.append((client, server))
+            used = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+
+            deflater = get_backend('zlib')[1](version, options['compression_level'],
+                                              options['window_bits'], options['mem_level'])
+            compressed_size = sum(len(deflater.compress(block)) for block in blocks)
+            print('spdy/%i %-8s %7.1f KiB/connection  ratio %.3f' % (
+                  version, name, used / 2048.0 / connections,
+                  float(compressed_size) / raw_size))
+
+def main(requests):
+    backends = ['ctypes']
+    if HAVE_ZDICT:
+        backends.insert(0, 'zlib')
+    for version in (2, 3):
+        blocks = header_blocks(version, requests)
+        for backend in backends:
+            run(backend, version, blocks)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'presets':
+        presets(int(sys.argv[2]) if len(sys.argv) > 2 else 20)
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
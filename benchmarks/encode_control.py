@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# coding: utf-8
+""" Control frame encoding cost, in microseconds per frame.
+
+    Usage: python benchmarks/encode_control.py [iterations]
+"""
+import sys
+import timeit
+from spdy.context import Context, CLIENT
+from spdy.frames import RstStream, Settings, Ping, Goaway, WindowUpdate, \
+                        INITIAL_WINDOW_SIZE, MAX_CONCURRENT_STREAMS, PERSIST_NONE
+
+def control_frames(version):
+    frames = [
+        Ping(1, version=version),
+        RstStream(1, 5, version=version),
+        Goaway(1, 0, version=version),
+        Settings(2, {INITIAL_WINDOW_SIZE: (PERSIST_NONE, 65536),
+                     MAX_CONCURRENT_STREAMS: (PERSIST_NONE, 100)},
+                 version=version),
+    ]
+    if version >= 3:
+        frames.append(WindowUpdate(1, 32768, version=version))
+    return frames
+
+def main(iterations):
+    for version in (2, 3):
+        ctx = Context(CLIENT, version=version)
+        for frame in control_frames(version):
+            seconds = min(timeit.repeat(lambda: ctx._encode_frame(frame),
+                                        number=iterations, repeat=5))
+            print('spdy/%i %-14s %8.2f us/frame' % (version, type(frame).__name__,
+                                                    seconds * 1e6 / iterations))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# coding: utf-8
+""" Memory per SPDY session: creates client/server Context pairs, runs a
+    scripted exchange on each one, and reports per Context (one end of a
+    session) the Python heap it keeps (tracemalloc) and the process RSS
+    growth, which includes what zlib allocates outside Python's allocator
+    (all of it for the ctypes backend).
+
+    idle:   a SETTINGS/PING exchange and a request/response, all streams
+            closed, like a keep-alive session between requests
+    active: `streams` requests open on each session, with responses
+            bigger than the flow control window still queued
+
+    The heap is broken down by the spdy code that allocated it:
+    compression (zlib streams), input buffer, streams (the stream table and
+    its state) and queued output (frames waiting in Context queues, with
+    their DATA payloads). DataFrames don't copy their data, they share the
+    caller's buffer: every response gets its own payload here, as an
+    application's would, allocated by payload() and counted as queued
+    output. Everything else, e.g. the Context object itself, counts as
+    context.
+    The heap can top the RSS: zlib allocates its window and hash tables up
+    front, but pages it hasn't written to yet take no memory.
+
+    Usage: python benchmarks/memory.py [sessions] [streams]
+"""
+import ast
+import gc
+import multiprocessing
+import os
+import sys
+import tracemalloc
+from spdy.compression import HAVE_ZDICT, PRESETS
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, SynReply, DataFrame, Settings, Ping, \
+                        FLAG_FIN, INITIAL_WINDOW_SIZE, MAX_CONCURRENT_STREAMS, \
+                        PERSIST_NONE
+import spdy
+
+CATEGORIES = ('compression', 'input buffer', 'streams', 'queued output', 'context')
+
+# spdy functions allocating for each category, by module; a module name
+# alone takes all of its functions
+_OWNERS = {
+    'compression': {'compression': None, 'c_zlib': None},
+    'input buffer': {'context': ('incoming', '_compact_input', '_detach_input')},
+    'streams': {'streams': None,
+                'context': ('_update_stream', '_update_windows', '_schedule_stream')},
+    'queued output': {'context': ('put_frame', '_next_stream_frame', '_split_data_frame',
+                                  '_scheduled_frames'),
+                      'memory': ('payload',)},
+}
+
+REQUEST = {':method': 'GET', ':path': '/index.html', ':version': 'HTTP/1.1',
+           ':host': 'www.example.com', ':scheme': 'https',
+           'user-agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:24.0) Gecko/20100101 Firefox/24.0',
+           'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+           'accept-encoding': 'gzip, deflate'}
+RESPONSE = {':status': '200 OK', ':version': 'HTTP/1.1', 'content-type': 'text/html',
+            'server': 'python-spdy'}
+PAYLOAD_SIZE = 96 * 1024
+
+def payload(size):
+    """ A response body of its own, like an application would send. Random
+        bytes, so its pages are written (and in the RSS). """
+    return os.urandom(size)
+
+def exchange(client, server, streams, active):
+    client.put_frame(Settings(1, {INITIAL_WINDOW_SIZE: (PERSIST_NONE, 65536)}))
+    server.put_frame(Settings(1, {MAX_CONCURRENT_STREAMS: (PERSIST_NONE, 100)}))
+    client.put_frame(Ping(client.next_ping_id))
+    for _ in range(streams if active else 1):
+        client.put_frame(SynStream(client.next_stream_id, REQUEST, flags=FLAG_FIN))
+    server.incoming(client.outgoing())
+    client.incoming(server.outgoing())
+    client.get_frames()
+    for frame in server.get_frames():
+        if isinstance(frame, Ping):
+            server.put_frame(Ping(frame.uniq_id))
+        elif isinstance(frame, SynStream):
+            server.put_frame(SynReply(frame.stream_id, RESPONSE, flags=0))
+            if active:
+                #more than the window lets out: the rest stays queued
+                server.put_frame(DataFrame(frame.stream_id, payload(PAYLOAD_SIZE), FLAG_FIN))
+            else:
+                server.put_frame(DataFrame(frame.stream_id, payload(2048), FLAG_FIN))
+    client.incoming(server.outgoing())
+    client.get_frames()
+
+def rss_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def _function_lines(path):
+    """ Returns (first line, last line, function name) for every function
+        of a module """
+    with open(path) as source:
+        tree = ast.parse(source.read())
+    return [(node.lineno, node.end_lineno, node.name) for node in ast.walk(tree)
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+
+class Classifier(object):
+    """ Puts a tracemalloc traceback in one of CATEGORIES, by the innermost
+        spdy function (or payload() of this module) with an owner in
+        _OWNERS """
+
+    def __init__(self):
+        package = os.path.dirname(os.path.abspath(spdy.__file__))
+        self.modules = {}
+        for name in os.listdir(package):
+            if name.endswith('.py'):
+                path = os.path.join(package, name)
+                self.modules[path] = (name[:-3], _function_lines(path))
+        path = os.path.abspath(__file__)
+        self.modules[path] = ('memory', _function_lines(path))
+
+    def function(self, frame):
+        module = self.modules.get(os.path.abspath(frame.filename))
+        if module is None:
+            return None, None
+        name, functions = module
+        #the innermost (shortest) function spanning the line
+        found = None
+        for first, last, function in functions:
+            if first <= frame.lineno <= last and (found is None or last - first < found[0]):
+                found = (last - first, function)
+        return name, found[1] if found else None
+
+    def __call__(self, traceback):
+        for frame in reversed(traceback):
+            module, function = self.function(frame)
+            if module is None:
+                continue
+            for category, owners in _OWNERS.items():
+                if module in owners and (owners[module] is None or
+                                         function in owners[module]):
+                    return category
+        return 'context'
+
+def measure(backend, preset, sessions, streams, active, trace, results):
+    """ Runs in a child process, puts the numbers for one configuration """
+    options = dict(PRESETS[preset], compression=backend)
+    if trace:
+        tracemalloc.start(25)
+    gc.collect()
+    before = tracemalloc.take_snapshot() if trace else None
+    rss = rss_bytes()
+
+    pairs = []
+    for _ in range(sessions):
+        client = Context(CLIENT, **options)
+        server = Context(SERVER, **options)
+        exchange(client, server, streams, active)
+        pairs.append((client, server))
+    gc.collect()
+
+    contexts = 2 * sessions
+    if not trace:
+        results.put((rss_bytes() - rss) / contexts)
+        return
+    classify = Classifier()
+    heap = dict((category, 0) for category in CATEGORIES)
+    for stat in tracemalloc.take_snapshot().compare_to(before, 'traceback'):
+        heap[classify(stat.traceback)] += stat.size_diff
+    results.put(dict((category, size / contexts) for category, size in heap.items()))
+
+def run(*args):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure, args=args + (results,))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def main(sessions, streams):
+    print('%d sessions, %d KiB responses on %d streams when active, KiB per Context' % (
+          sessions, PAYLOAD_SIZE // 1024, streams))
+    print('DataFrames share the caller\'s buffer (no copy): queued output includes the '
+          'payloads the application allocated')
+    print('%-6s %-8s %-6s %8s %8s  %s' % ('', 'preset', 'state', 'RSS', 'heap',
+                                          '  '.join('%13s' % c for c in CATEGORIES)))
+    backends = (['zlib'] if HAVE_ZDICT else []) + ['ctypes']
+    for backend in backends:
+        for preset in ('default', 'small'):
+            for active in (False, True):
+                rss = run(backend, preset, sessions, streams, active, False)
+                heap = run(backend, preset, sessions, streams, active, True)
+                print('%-6s %-8s %-6s %8.1f %8.1f  %s' % (
+                      backend, preset, 'active' if active else 'idle',
+                      rss / 1024, sum(heap.values()) / 1024,
+                      '  '.join('%13.1f' % (heap[c] / 1024) for c in CATEGORIES)))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 10)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding: utf-8
+""" Time to first byte of a high priority stream, while a low priority
+    download keeps the connection busy. The link is simulated: the server
+    writes write_size bytes per tick, at a fixed bandwidth, refilling its
+    socket buffer with Context.outgoing() whenever it runs low.
+
+    fifo: the server Context doesn't know the streams, so it sends frames
+          in the order they were put, like it did before the scheduler
+    same priority: both streams have priority 3 (round-robin)
+    priority: download at priority 7, page at priority 0
+
+    Usage: python benchmarks/priority.py [download KiB] [bandwidth KiB/s]
+"""
+import sys
+from timeit import default_timer as timer
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, SynReply, DataFrame, Settings, \
+                        FLAG_FIN, INITIAL_WINDOW_SIZE, PERSIST_NONE
+
+FRAME_SIZE = 16 * 1024
+WRITE_SIZE = 64 * 1024
+PAGE_SIZE = 48 * 1024
+
+def request(stream_id, priority):
+    return SynStream(stream_id, {':method': 'GET', ':path': '/', ':version': 'HTTP/1.1',
+                                 ':host': 'www.example.com', ':scheme': 'https'},
+                     priority=priority, flags=FLAG_FIN)
+
+def respond(server, stream_id, size):
+    server.put_frame(SynReply(stream_id, {':status': '200 OK', ':version': 'HTTP/1.1'},
+                              flags=0))
+    payload = b'x' * FRAME_SIZE
+    for offset in range(0, size, FRAME_SIZE):
+        last = offset + FRAME_SIZE >= size
+        server.put_frame(DataFrame(stream_id, payload, FLAG_FIN if last else 0))
+
+def connect(download_priority, page_priority, known):
+    client = Context(CLIENT)
+    server = Context(SERVER)
+    #a window big enough for flow control to stay out of the picture
+    client.put_frame(Settings(1, {INITIAL_WINDOW_SIZE: (PERSIST_NONE, 1 << 30)}))
+    server.incoming(client.outgoing())
+    server.get_frames()
+    client.put_frame(request(1, download_priority))
+    client.put_frame(request(3, page_priority))
+    wire = client.outgoing()
+    if known:
+        server.incoming(wire)
+        server.get_frames()
+    return client, server
+
+def simulate(download_priority, page_priority, known, download_size, bandwidth):
+    """ Returns the page's time to first byte and to last byte, in ms """
+    client, server = connect(download_priority, page_priority, known)
+    respond(server, 1, download_size)
+    socket_buffer = bytearray()
+    clock = 0.0
+    page_requested = None
+    first_byte = None
+    while True:
+        if len(socket_buffer) < WRITE_SIZE:
+            socket_buffer.extend(server.outgoing(WRITE_SIZE))
+        if not socket_buffer:
+            break
+        chunk = socket_buffer[:WRITE_SIZE]
+        del socket_buffer[:WRITE_SIZE]
+        clock += float(len(chunk)) / bandwidth
+        client.incoming(chunk)
+        for frame in client.get_frames():
+            if frame.is_control or frame.stream_id != 3:
+                continue
+            if first_byte is None:
+                first_byte = clock
+            if frame.fin:
+                return ((first_byte - page_requested) * 1000,
+                        (clock - page_requested) * 1000)
+        if page_requested is None:
+            #the page is requested once the download is under way
+            page_requested = clock
+            respond(server, 3, PAGE_SIZE)
+
+def drain_time(known, download_size, repeat=5):
+    """ CPU time of outgoing() per DATA frame, in us """
+    best = None
+    for _ in range(repeat):
+        client, server = connect(7, 0, known)
+        respond(server, 1, download_size)
+        start = timer()
+        while server.outgoing(WRITE_SIZE):
+            pass
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6 / (download_size // FRAME_SIZE)
+
+def main(download_kib, bandwidth_kib):
+    download_size = download_kib * 1024
+    bandwidth = bandwidth_kib * 1024
+    print('%d KiB download, %d KiB page, %d KiB/s link, %d KiB writes' % (
+          download_kib, PAGE_SIZE // 1024, bandwidth_kib, WRITE_SIZE // 1024))
+    for name, download_priority, page_priority, known in (
+            ('fifo', 3, 3, False),
+            ('same priority', 3, 3, True),
+            ('priority', 7, 0, True)):
+        ttfb, ttlb = simulate(download_priority, page_priority, known,
+                              download_size, bandwidth)
+        print('%-14s page TTFB %8.1f ms, complete %8.1f ms' % (name, ttfb, ttlb))
+    print('outgoing() per DATA frame: fifo %.2f us, scheduled %.2f us' % (
+          drain_time(False, download_size), drain_time(True, download_size)))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4096,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 10240)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# coding: utf-8
+""" Load test of spdy.server over loopback. The server runs in a child
+    process; the client opens `connections` sessions and keeps `streams`
+    requests in flight on each one, until `requests` are done. Reports
+    requests/sec and the p50/p99 request latency.
+
+    Usage: python benchmarks/server_load.py [requests] [connections] [streams] [body bytes]
+"""
+import asyncio
+import multiprocessing
+import socket
+import sys
+from timeit import default_timer as timer
+from spdy.aio import connect
+from spdy.server import SpdyServer
+
+REQUEST_HEADERS = {':method': 'GET', ':path': '/', ':version': 'HTTP/1.1',
+                   ':host': 'www.example.com', ':scheme': 'http'}
+
+def listening_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(1024)
+    return sock
+
+def run_server(sock, body_size, ready):
+    body = b'x' * body_size
+
+    def handler(headers, request_body):
+        return {':status': '200 OK', ':version': 'HTTP/1.1'}, body
+
+    async def main():
+        await SpdyServer(handler).start(sock=sock)
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+async def load(port, requests, connections, streams):
+    sessions = await asyncio.gather(*[connect('127.0.0.1', port)
+                                      for _ in range(connections)])
+    #warm-up: TCP handshake and header compression dictionaries
+    await asyncio.gather(*[request(session) for session in sessions])
+    latencies = []
+    remaining = [requests]
+
+    async def worker(session):
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = timer()
+            await request(session)
+            latencies.append(timer() - start)
+
+    start = timer()
+    await asyncio.gather(*[worker(session) for session in sessions
+                           for _ in range(streams)])
+    elapsed = timer() - start
+    for session in sessions:
+        session.close()
+    return elapsed, sorted(latencies)
+
+async def request(session):
+    stream = session.open_stream(REQUEST_HEADERS, fin=True)
+    await stream.response()
+    return await stream.read()
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main(requests, connections, streams, body_size):
+    sock = listening_socket()
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server, args=(sock, body_size, ready))
+    server.start()
+    try:
+        ready.wait()
+        elapsed, latencies = asyncio.run(load(sock.getsockname()[1], requests,
+                                              connections, streams))
+    finally:
+        server.terminate()
+        server.join()
+    print('%d requests, %d connections x %d streams, %d byte bodies' % (
+          requests, connections, streams, body_size))
+    print('%.0f requests/sec, latency p50 %.2f ms, p99 %.2f ms' % (
+          len(latencies) / elapsed, percentile(latencies, 0.5) * 1000,
+          percentile(latencies, 0.99) * 1000))
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    defaults = [20000, 10, 10, 1024]
+    main(*(args + defaults[len(args):]))
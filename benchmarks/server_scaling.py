@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# coding: utf-8
+""" Throughput of spdy.server.serve() with 1, 2, 4... worker processes, up
+    to the number of CPUs, over loopback. As many client processes as
+    workers run the load of server_load.py, so the clients scale too (and
+    share the same CPUs).
+
+    Usage: python benchmarks/server_scaling.py [requests per client] [max workers]
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from server_load import load
+from spdy.server import serve
+
+def free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def handler(headers, body):
+    return {':status': '200 OK', ':version': 'HTTP/1.1'}, b'x' * 1024
+
+def wait_listening(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('server did not start')
+
+def client(port, requests):
+    elapsed, latencies = asyncio.run(load(port, requests, 4, 10))
+    return elapsed, len(latencies)
+
+def run(workers, requests):
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(handler, '127.0.0.1', port),
+                                     kwargs={'workers': workers})
+    server.start()
+    try:
+        wait_listening(port)
+        #the rest of the workers may still be starting
+        time.sleep(0.5)
+        pool = multiprocessing.Pool(workers)
+        try:
+            start = time.time()
+            results = pool.starmap(client, [(port, requests)] * workers)
+            elapsed = time.time() - start
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        os.kill(server.pid, signal.SIGTERM)
+        server.join()
+    return sum(done for _, done in results) / elapsed
+
+def main(requests, max_workers):
+    print('%d CPUs, %d requests per client process' % (multiprocessing.cpu_count(), requests))
+    base = None
+    workers = 1
+    while workers <= max_workers:
+        rate = run(workers, requests)
+        base = base or rate
+        print('%2d workers: %7.0f requests/sec (x%.2f)' % (workers, rate, rate / base))
+        workers *= 2
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count())
@@ -80,11 +80,12 @@ def get_page(spdy_ctx, host, path='/'):
     print('>>', syn_frame, 'Headers:', syn_frame.headers)
     spdy_ctx.put_frame(syn_frame)
 
-def get_frame(spdy_ctx):
+def get_frames(spdy_ctx):
     try:
-        return spdy_ctx.get_frame()
+        return spdy_ctx.get_frames()
     except SpdyProtocolError as e:
         print ('error parsing frame: %s' % str(e))
+        return e.frames
 
 if __name__ == '__main__':
     host, port = parse_args()
@@ -113,8 +114,7 @@ if __name__ == '__main__':
         answer = connection.read() # Blocking
         #print '<<\n', str2hexa(answer)
         spdy_ctx.incoming(answer)
-        frame = get_frame(spdy_ctx)
-        while frame:
+        for frame in get_frames(spdy_ctx):
             if hasattr(frame, 'headers'):
                 print ('<<', frame, 'Headers:', frame.headers)
                 content_type_id[frame.stream_id] = frame.headers.get('content-encoding')                      
@@ -129,6 +129,9 @@ if __name__ == '__main__':
                 file_out.flush()
             else:
                 print ('<<', frame)
-            frame = get_frame(spdy_ctx)
             if isinstance(frame, Goaway):
                 goaway = True
+        # WINDOW_UPDATEs for the DATA received, or the server stops sending
+        out = spdy_ctx.outgoing()
+        if out:
+            connection.write(out)
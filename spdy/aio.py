@@ -0,0 +1,442 @@
+# coding: utf-8
+""" asyncio integration. SpdyProtocol drives a Context from the event loop,
+    and every stream of the session is a SpdyStream, with a reader for the
+    data the peer sends and methods to reply, write and close it.
+
+    Frames put by the streams during one event loop iteration go out in a
+    single transport write. Python 3.7+ only, like spdy.server and
+    spdy.client, which build on it; the rest of the package doesn't import
+    it and keeps working on older Pythons.
+"""
+import asyncio
+from spdy.context import Context, CLIENT
+from spdy.frames import SynStream, SynReply, RstStream, Headers, DataFrame, \
+                        Ping, Goaway, SpdyProtocolError, DEFAULT_VERSION, \
+                        SYN_STREAM, SYN_REPLY, RST_STREAM, SETTINGS, PING, GOAWAY, \
+                        HEADERS, ERROR_CODES, FLAG_FIN, CANCEL, INTERNAL_ERROR, REFUSED_STREAM, \
+                        GOAWAY_OK, GOAWAY_PROTOCOL_ERROR
+from spdy.streams import MAX_WINDOW_SIZE
+
+# Bytes read from the transport at once. Each connection keeps a buffer
+# this big, so it's kept small for servers with many idle sessions.
+READ_SIZE = 16 * 1024
+
+# DATA bytes written per event loop iteration, so one busy session doesn't
+# hold the loop; the rest goes on the next iteration
+WRITE_SIZE = 256 * 1024
+
+# SpdyStream.drain() waits while a stream has more DATA than this queued
+HIGH_WATER = 64 * 1024
+
+
+class StreamReset(ConnectionError):
+    """ The stream was reset (RST_STREAM) or its session was lost.
+        error_code is the RST_STREAM status code, if there's one. """
+
+    def __init__(self, message, error_code=None):
+        super(StreamReset, self).__init__(message)
+        self.error_code = error_code
+
+
+class SpdyStream(object):
+    """ One stream of a SpdyProtocol. `headers` are the ones of its
+        SYN_STREAM, `reader` an asyncio.StreamReader with the DATA the peer
+        sent (EOF after its FIN). In SPDY/3 the peer may only send more once
+        that DATA is read with read() or readexactly(), which open the flow
+        control window again. The writing methods only queue frames,
+        drain() waits until the queued DATA goes out. """
+
+    def __init__(self, protocol, stream_id, headers):
+        self.protocol = protocol
+        self.stream_id = stream_id
+        self.headers = headers
+        self.reply_headers = None
+        self.reader = asyncio.StreamReader()
+        self.error = None
+        self._reply = protocol.loop.create_future()
+
+    def __repr__(self):
+        return '<SpdyStream id={0}>'.format(self.stream_id)
+
+    async def read(self, n=-1):
+        if n < 0:
+            #the reader's read(-1) would only return at EOF, with the window
+            #closed all along; take the DATA as it comes instead (never more
+            #than a window is buffered)
+            blocks = []
+            while True:
+                block = await self.read(MAX_WINDOW_SIZE)
+                if not block:
+                    return b''.join(blocks)
+                blocks.append(block)
+        data = await self.reader.read(n)
+        self._consumed(len(data))
+        return data
+
+    async def readexactly(self, n):
+        #piecewise, as for read(-1): n may be more than the window
+        blocks = []
+        missing = n
+        while missing:
+            block = await self.read(missing)
+            if not block:
+                raise asyncio.IncompleteReadError(b''.join(blocks), n)
+            blocks.append(block)
+            missing -= len(block)
+        return b''.join(blocks)
+
+    def at_eof(self):
+        return self.reader.at_eof()
+
+    async def response(self):
+        """ Waits for the SYN_REPLY of a stream we opened, returns its headers """
+        return await asyncio.shield(self._reply)
+
+    def reply(self, headers, fin=False):
+        self._check()
+        self.protocol.send_frame(SynReply(self.stream_id, headers,
+                                          flags=FLAG_FIN if fin else 0,
+                                          version=self.protocol.version))
+
+    def send_headers(self, headers, fin=False):
+        self._check()
+        self.protocol.send_frame(Headers(self.stream_id, headers,
+                                         flags=FLAG_FIN if fin else 0,
+                                         version=self.protocol.version))
+
+    def write(self, data, fin=False):
+        self._check()
+        self.protocol.send_frame(DataFrame(self.stream_id, data,
+                                           FLAG_FIN if fin else 0))
+
+    def write_eof(self):
+        self.write(b'', fin=True)
+
+    def reset(self, status_code=CANCEL):
+        self._check()
+        self.protocol.send_frame(RstStream(self.stream_id, status_code,
+                                           version=self.protocol.version))
+        self._lost(StreamReset('stream {0} reset'.format(self.stream_id), status_code))
+
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+
+    def _consumed(self, size):
+        context = self.protocol.context
+        if size and not context.closed:
+            context.consume(self.stream_id, size)
+            if context.frame_queue:
+                #a WINDOW_UPDATE to send
+                self.protocol._schedule_flush()
+
+    async def drain(self):
+        """ Waits until the transport takes writes and this stream has at
+            most HIGH_WATER bytes of DATA queued """
+        protocol = self.protocol
+        while True:
+            self._check()
+            stream = protocol.context.get_stream(self.stream_id)
+            if not protocol.paused and (stream is None or stream.pending_bytes <= HIGH_WATER):
+                return
+            waiter = protocol.loop.create_future()
+            protocol._drain_waiters.append(waiter)
+            await waiter
+
+    def _received(self, frame):
+        """ Hands a frame of this stream to the reader / waiters """
+        if not frame.is_control:
+            if len(frame.data):
+                self.reader.feed_data(frame.data)
+        elif frame.frame_type == SYN_REPLY:
+            self.reply_headers = frame.headers
+            if not self._reply.done():
+                self._reply.set_result(self.reply_headers)
+        elif frame.frame_type == HEADERS:
+            if self.reply_headers is None:
+                self.reply_headers = {}
+            self.reply_headers.update(frame.headers)
+        elif frame.frame_type == RST_STREAM:
+            self._lost(StreamReset('stream {0} reset: {1}'.format(
+                                   self.stream_id, ERROR_CODES.get(frame.error_code,
+                                                                   frame.error_code)),
+                                   frame.error_code))
+            return
+        if frame.flags & FLAG_FIN:
+            self.reader.feed_eof()
+
+    def _lost(self, exc):
+        self.error = exc
+        if not self.reader.at_eof():
+            self.reader.set_exception(exc)
+        if not self._reply.done():
+            self._reply.set_exception(exc)
+            #nobody may be waiting for it
+            self._reply.exception()
+
+
+class SpdyProtocol(asyncio.BufferedProtocol):
+    """ asyncio protocol for one SPDY session. on_stream is called with a
+        SpdyStream for every stream the peer opens; it may be a coroutine
+        function, run as a task (an exception resets the stream). Other
+        keyword arguments are passed on to the Context, e.g. one of
+        spdy.compression.PRESETS to fit more sessions in memory. Received
+        DATA is only acknowledged as the streams read it, unless
+        auto_consume=True is passed. """
+
+    def __init__(self, side, version=DEFAULT_VERSION, on_stream=None,
+                 read_size=READ_SIZE, write_size=WRITE_SIZE, loop=None,
+                 **context_options):
+        self.side = side
+        self.version = version
+        self.on_stream = on_stream
+        self.read_size = read_size
+        self.write_size = write_size
+        self.loop = loop or asyncio.get_event_loop()
+        context_options.setdefault('auto_consume', False)
+        self.context = Context(side, version, **context_options)
+        self.transport = None
+        self.streams = {}
+        # local_streams: the streams in self.streams we opened
+        self.local_streams = 0
+        # peer_settings: values of the SETTINGS received, by id
+        self.peer_settings = {}
+        self.paused = False
+        self.goaway = False
+        self.closed = self.loop.create_future()
+        self._buffer = None
+        self._flush_handle = None
+        self._drain_waiters = []
+        self._ping_waiters = {}
+        self._last_peer_stream_id = 0
+        self._goaway_sent = False
+
+    # asyncio callbacks
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._buffer = memoryview(bytearray(self.read_size))
+
+    def get_buffer(self, sizehint):
+        return self._buffer
+
+    def buffer_updated(self, nbytes):
+        context = self.context
+        context.incoming(self._buffer[:nbytes])
+        try:
+            for frame in context.iter_frames():
+                self._frame_received(frame)
+        except SpdyProtocolError:
+            self.send_goaway(GOAWAY_PROTOCOL_ERROR)
+            self.close()
+
+    def eof_received(self):
+        #no half-closed TCP connections in SPDY
+        return False
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self._schedule_flush()
+        self._wake_drain_waiters()
+
+    def connection_lost(self, exc):
+        self.transport = None
+        lost = StreamReset('connection lost' if exc is None else str(exc))
+        for stream in self.streams.values():
+            stream._lost(lost)
+        self.streams.clear()
+        self.local_streams = 0
+        for waiter in self._ping_waiters.values():
+            if not waiter.done():
+                waiter.set_exception(lost)
+        self._ping_waiters.clear()
+        self._wake_drain_waiters()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.context.close()
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    # streams and frames
+
+    def open_stream(self, headers, priority=0, fin=False):
+        """ Opens a stream with a SYN_STREAM, returns its SpdyStream """
+        if self.goaway or self.transport is None:
+            raise StreamReset('session is closing')
+        stream_id = self.context.next_stream_id
+        stream = SpdyStream(self, stream_id, headers)
+        self.streams[stream_id] = stream
+        self.local_streams += 1
+        self.send_frame(SynStream(stream_id, headers, priority=priority,
+                                  flags=FLAG_FIN if fin else 0, version=self.version))
+        return stream
+
+    async def ping(self):
+        """ Sends a PING, returns the round trip time in seconds """
+        ping_id = self.context.next_ping_id
+        waiter = self._ping_waiters[ping_id] = self.loop.create_future()
+        start = self.loop.time()
+        self.send_frame(Ping(ping_id, version=self.version))
+        await waiter
+        return self.loop.time() - start
+
+    def send_goaway(self, status_code=GOAWAY_OK):
+        """ Sends GOAWAY: streams the peer opens from now on are refused,
+            the ones already open go on """
+        if self._goaway_sent or self.transport is None:
+            return
+        self._goaway_sent = True
+        self.goaway = True
+        if self.version < 3:
+            status_code = None
+        self.send_frame(Goaway(self._last_peer_stream_id, status_code,
+                               version=self.version))
+
+    async def wait_idle(self):
+        """ Waits until the session has no open streams, so none of them
+            has DATA left to send (or until the connection is lost) """
+        while self.transport is not None and self.context.streams:
+            waiter = self.loop.create_future()
+            self._drain_waiters.append(waiter)
+            await waiter
+
+    def close(self):
+        """ Sends GOAWAY and everything still queued, then closes the
+            connection """
+        if self.transport is None:
+            return
+        self.send_goaway()
+        self._flush(write_size=None)
+        if self.transport is not None:
+            self.transport.close()
+
+    def send_frame(self, frame):
+        self.context.put_frame(frame)
+        self._schedule_flush()
+
+    def _frame_received(self, frame):
+        if not frame.is_control or frame.frame_type in (SYN_REPLY, HEADERS, RST_STREAM):
+            stream = self.streams.get(frame.stream_id)
+            if stream is not None:
+                stream._received(frame)
+                if self.context.get_stream(frame.stream_id) is None:
+                    self._forget(frame.stream_id)
+            if not frame.is_control and self.context.frame_queue:
+                #a WINDOW_UPDATE (auto_consume) or RST_STREAM to send
+                self._schedule_flush()
+            return
+
+        frame_type = frame.frame_type
+        if frame_type == SYN_STREAM:
+            self._last_peer_stream_id = frame.stream_id
+            if self.goaway or self.on_stream is None:
+                self.send_frame(RstStream(frame.stream_id, REFUSED_STREAM,
+                                          version=self.version))
+                return
+            stream = SpdyStream(self, frame.stream_id, frame.headers)
+            self.streams[frame.stream_id] = stream
+            if frame.flags & FLAG_FIN:
+                stream.reader.feed_eof()
+            self._start_handler(stream)
+        elif frame_type == PING:
+            #clients use odd ids, servers even ones
+            if (frame.uniq_id % 2 == 1) == (self.side == CLIENT):
+                waiter = self._ping_waiters.pop(frame.uniq_id, None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+            else:
+                self.send_frame(Ping(frame.uniq_id, version=self.version))
+        elif frame_type == GOAWAY:
+            self.goaway = True
+        else:
+            if frame_type == SETTINGS:
+                for setting_id, (_, value) in frame.id_value_pairs.items():
+                    self.peer_settings[setting_id] = value
+            #SETTINGS and WINDOW_UPDATE, the Context may have DATA to send now
+            self._schedule_flush()
+
+    def _forget(self, stream_id):
+        """ Drops a stream the Context is done with """
+        del self.streams[stream_id]
+        #clients open odd streams, servers even ones
+        if (stream_id % 2 == 1) == (self.side == CLIENT):
+            self.local_streams -= 1
+        #for wait_idle()
+        self._wake_drain_waiters()
+
+    def _start_handler(self, stream):
+        try:
+            result = self.on_stream(stream)
+            if asyncio.iscoroutine(result) or asyncio.isfuture(result):
+                task = asyncio.ensure_future(result)
+                task.add_done_callback(lambda task: self._handler_done(stream, task))
+        except Exception as exc:
+            self._handler_failed(stream, exc)
+
+    def _handler_done(self, stream, task):
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None and exc is not stream.error:
+            self._handler_failed(stream, exc)
+
+    def _handler_failed(self, stream, exc):
+        self.loop.call_exception_handler({
+            'message': 'SPDY stream handler failed',
+            'exception': exc,
+            'protocol': self,
+        })
+        if stream.error is None:
+            stream.reset(INTERNAL_ERROR)
+
+    # output
+
+    def _schedule_flush(self):
+        if self._flush_handle is None and self.transport is not None:
+            self._flush_handle = self.loop.call_soon(self._flush)
+
+    def _flush(self, write_size=-1):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self.transport is None:
+            return
+        context = self.context
+        if write_size == -1:
+            #only control frames while the transport buffer is full
+            write_size = 0 if self.paused else self.write_size
+        data = context.outgoing(write_size)
+        if data:
+            self.transport.write(data)
+            if write_size and len(data) >= write_size:
+                #there may be more, after the other sessions had their turn
+                self._schedule_flush()
+        for stream_id in [stream_id for stream_id in self.streams
+                          if context.get_stream(stream_id) is None]:
+            self._forget(stream_id)
+        self._wake_drain_waiters()
+
+    def _wake_drain_waiters(self):
+        waiters, self._drain_waiters = self._drain_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+async def connect(host, port, version=DEFAULT_VERSION, ssl=None, server_hostname=None,
+                  **options):
+    """ Opens a client session, returns its SpdyProtocol. ssl and
+        server_hostname are the ones of loop.create_connection(). """
+    loop = asyncio.get_event_loop()
+    if ssl is not None:
+        connection_options = {'ssl': ssl, 'server_hostname': server_hostname or host}
+    else:
+        connection_options = {}
+    _, protocol = await loop.create_connection(
+        lambda: SpdyProtocol(CLIENT, version, loop=loop, **options), host, port,
+        **connection_options)
+    return protocol
@@ -0,0 +1,101 @@
+# coding: utf-8
+""" SPDY client on asyncio (Python 3.7+), see spdy.aio.
+
+    SessionPool keeps the sessions open, one per (host, port), and sends
+    concurrent requests to the same origin as streams of that session:
+
+        pool = SessionPool(ssl=ssl_context)
+        headers, body = await pool.request('www.example.com', 443, {
+            ':method': 'GET', ':path': '/', ':version': 'HTTP/1.1',
+            ':host': 'www.example.com', ':scheme': 'https'})
+        pool.close()
+"""
+import asyncio
+from spdy.aio import connect, StreamReset
+from spdy.frames import DEFAULT_VERSION, MAX_CONCURRENT_STREAMS, REFUSED_STREAM
+
+# Times a request is sent again after REFUSED_STREAM
+REFUSED_RETRIES = 3
+
+
+class SessionPool(object):
+    """ Client sessions by (host, port). A request takes a stream from the
+        first session of its origin the peer lets open one more (see its
+        MAX_CONCURRENT_STREAMS, or the one its other sessions announced if
+        it hasn't sent SETTINGS yet), and a new session is only opened when
+        all of them are full or going away. ssl is an ssl.SSLContext, or None
+        for plain TCP; other keyword arguments are passed on to every
+        SpdyProtocol and Context. """
+
+    def __init__(self, version=DEFAULT_VERSION, ssl=None, **options):
+        self.version = version
+        self.ssl = ssl
+        self.options = options
+        self.sessions = {}
+        # MAX_CONCURRENT_STREAMS last announced by each origin
+        self.limits = {}
+        self._connecting = {}
+
+    async def session(self, host, port):
+        """ Returns a session to (host, port) with room for another stream """
+        origin = (host, port)
+        while True:
+            for protocol in self.sessions.get(origin, ()):
+                if protocol.goaway or protocol.transport is None:
+                    continue
+                limit = protocol.peer_settings.get(MAX_CONCURRENT_STREAMS)
+                if limit is None:
+                    limit = self.limits.get(origin)
+                else:
+                    self.limits[origin] = limit
+                if limit is None or protocol.local_streams < limit:
+                    return protocol
+
+            connecting = self._connecting.get(origin)
+            if connecting is None:
+                connecting = asyncio.ensure_future(self._connect(origin))
+                self._connecting[origin] = connecting
+                connecting.add_done_callback(lambda _: self._connecting.pop(origin, None))
+            #whoever waited for it competes for its streams
+            await asyncio.shield(connecting)
+
+    async def _connect(self, origin):
+        protocol = await connect(origin[0], origin[1], self.version, ssl=self.ssl,
+                                 **self.options)
+        self.sessions.setdefault(origin, []).append(protocol)
+        protocol.closed.add_done_callback(lambda _: self._session_closed(origin, protocol))
+        return protocol
+
+    def _session_closed(self, origin, protocol):
+        sessions = self.sessions.get(origin)
+        if sessions and protocol in sessions:
+            sessions.remove(protocol)
+            if not sessions:
+                del self.sessions[origin]
+
+    async def open_stream(self, host, port, headers, priority=0, fin=False):
+        """ Opens a stream to (host, port), returns its SpdyStream """
+        protocol = await self.session(host, port)
+        return protocol.open_stream(headers, priority=priority, fin=fin)
+
+    async def request(self, host, port, headers, body=None, priority=0):
+        """ Sends a request, returns the response headers and body. It's
+            sent again (up to REFUSED_RETRIES times) if the peer refuses the
+            stream, e.g. above its limit, as it wasn't processed then. """
+        for attempt in range(REFUSED_RETRIES + 1):
+            stream = await self.open_stream(host, port, headers, priority, fin=not body)
+            if body:
+                stream.write(body, fin=True)
+            try:
+                response_headers = await stream.response()
+            except StreamReset as exc:
+                if exc.error_code != REFUSED_STREAM or attempt == REFUSED_RETRIES:
+                    raise
+                continue
+            return response_headers, await stream.read()
+
+    def close(self):
+        """ Closes every session """
+        for sessions in list(self.sessions.values()):
+            for protocol in list(sessions):
+                protocol.close()
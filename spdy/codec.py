@@ -0,0 +1,179 @@
+# coding: utf-8
+""" Precompiled struct-based codecs for the frame definitions in spdy.frames """
+import operator
+import struct
+
+# Fixed frame headers, see DataFrame and ControlFrame in spdy.frames
+_control_header_format = '>HHI'
+CONTROL_HEADER = struct.Struct(_control_header_format)
+DATA_HEADER = struct.Struct('>II')
+
+# Name/Value block lengths are int16 in SPDY v2 and int32 in SPDY v3
+NV_LENGTH = {
+    2: struct.Struct('>H'),
+    3: struct.Struct('>I'),
+}
+
+# SETTINGS ID/Value pairs
+UINT32 = struct.Struct('>I')
+UINT32_LE = struct.Struct('<I')
+
+_formats = {
+    8: 'B',
+    16: 'H',
+    32: 'I',
+    64: 'Q',
+}
+
+_control_bit = 0x8000
+_last_24_bits = 0xffffff
+_last_31_bits = 0x7fffffff
+
+class FrameCodec(object):
+    """ Compiled form of a ControlFrame definition for one SPDY version.
+
+    Consecutive fields are grouped into the smallest byte-aligned word
+    (8/16/32/64 bits), so the whole fixed part of the frame is read with
+    a single unpack_from() call. Every field is then a shift and a mask
+    over one of those words. A trailing field with -1 bits (headers or
+    settings pairs) is left to the caller, as its name in `tail`.
+
+    Encoding is symmetric: `packer` prepends the control frame header to
+    the same words, so header and fields are written by one pack_into().
+    A field value or a frame length that doesn't fit raises ValueError.
+    """
+
+    def __init__(self, definition):
+        fmt = '>'
+        fields = []
+        words = []
+        group = []
+        group_bits = 0
+        self.tail = None
+
+        for key, num_bits in definition:
+            if num_bits == -1:
+                self.tail = key
+                break
+            group.append((key, num_bits))
+            group_bits += num_bits
+            if group_bits % 8:
+                continue
+            if group_bits not in _formats:
+                raise ValueError('unsupported field group of {0} bits'.format(group_bits))
+
+            index = len(fmt) - 1
+            fmt += _formats[group_bits]
+            word = []
+            shift = group_bits
+            for field_key, field_bits in group:
+                shift -= field_bits
+                if field_key:
+                    fields.append((field_key, index, shift, (1 << field_bits) - 1))
+                    word.append((field_key, shift, (1 << field_bits) - 1))
+            words.append(tuple(word))
+            group = []
+            group_bits = 0
+
+        if group:
+            raise ValueError('frame definition is not byte aligned')
+
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+        self.fields = tuple(fields)
+        self.words = tuple(words)
+        self._getter = None
+        if all(len(word) == 1 and word[0][1] == 0 for word in self.words):
+            keys = [word[0][0] for word in self.words]
+            #(index, key, mask) of every value the getter returns
+            self._masks = tuple((index, key, mask)
+                                for index, ((key, _, mask),) in enumerate(self.words))
+            if len(keys) == 1:
+                #attrgetter returns a bare value for a single attribute
+                getter = operator.attrgetter(keys[0])
+                self._getter = lambda frame: (getter(frame),)
+            elif keys:
+                self._getter = operator.attrgetter(*keys)
+        self.packer = struct.Struct(_control_header_format + fmt[1:])
+
+    def decode(self, buf, offset, args):
+        """ Unpacks the fixed fields found at buf[offset:] into args,
+            returns the offset where the trailing field begins. """
+        words = self.struct.unpack_from(buf, offset)
+        for key, index, shift, mask in self.fields:
+            args[key] = (words[index] >> shift) & mask
+        return offset + self.size
+
+    def encode(self, frame, tail=b''):
+        """ Returns the whole control frame as a bytes-like object: header,
+            fixed fields taken from frame's attributes, and the tail bytes. """
+        length = self.size + len(tail)
+        if self._getter is not None:
+            #one field per word: attribute values are packed as they are
+            words = self._getter(frame)
+            for index, key, mask in self._masks:
+                if words[index] & ~mask:
+                    _field_error(key, words[index], mask)
+        else:
+            words = []
+            for word in self.words:
+                value = 0
+                for key, shift, mask in word:
+                    field = getattr(frame, key)
+                    if field & ~mask:
+                        _field_error(key, field, mask)
+                    value |= field << shift
+                words.append(value)
+
+        if not tail:
+            return self.packer.pack(_control_bit | frame.version, frame.frame_type,
+                                    (frame.flags << 24) | length, *words)
+
+        if length > _last_24_bits:
+            _length_error(length)
+        header_size = self.packer.size
+        out = bytearray(header_size + len(tail))
+        self.packer.pack_into(out, 0, _control_bit | frame.version, frame.frame_type,
+                              (frame.flags << 24) | length, *words)
+        out[header_size:] = tail
+        return out
+
+def _field_error(key, value, mask):
+    raise ValueError('{0} {1} does not fit in {2} bits'.format(key, value, mask.bit_length()))
+
+def _length_error(length):
+    raise ValueError('frame length {0} does not fit in 24 bits'.format(length))
+
+def encode_data_header(frame):
+    """ Returns the 8 bytes of the DATA frame header, without its data """
+    length = len(frame.data)
+    if length > _last_24_bits:
+        _length_error(length)
+    if frame.stream_id & ~_last_31_bits:
+        _field_error('stream_id', frame.stream_id, _last_31_bits)
+    return DATA_HEADER.pack(frame.stream_id, (frame.flags << 24) | length)
+
+def encode_data_frame(frame):
+    """ Returns a bytearray with the DATA frame header followed by its data """
+    data = frame.data
+    length = len(data)
+    if length > _last_24_bits:
+        _length_error(length)
+    if frame.stream_id & ~_last_31_bits:
+        _field_error('stream_id', frame.stream_id, _last_31_bits)
+    out = bytearray(DATA_HEADER.size + length)
+    DATA_HEADER.pack_into(out, 0, frame.stream_id, (frame.flags << 24) | length)
+    out[DATA_HEADER.size:] = data
+    return out
+
+_codecs = {}
+
+def get_codec(frame_cls, version):
+    """ Returns the FrameCodec for frame_cls in the given SPDY version,
+        compiling its definition only the first time it's requested. """
+    try:
+        return _codecs[(frame_cls, version)]
+    except KeyError:
+        codec = FrameCodec(frame_cls.definition(version))
+        _codecs[(frame_cls, version)] = codec
+        return codec
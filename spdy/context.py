@@ -1,14 +1,31 @@
 # coding: utf-8
-from sys import version_info
-from bitarray import bitarray
-from spdy.c_zlib import Inflater, Deflater, ZLIB_DICT_V2, ZLIB_DICT_V3
-from spdy.frames import Frame, DataFrame, DEFAULT_VERSION, VERSIONS, FRAME_TYPES
+from timeit import default_timer as timer
+from collections import deque
+from spdy.compression import get_backend, DEFAULT_LEVEL, DEFAULT_WINDOW_BITS, \
+                             DEFAULT_MEM_LEVEL
+from spdy.frames import Frame, DataFrame, RstStream, WindowUpdate, HeaderBlock, \
+                        SpdyProtocolError, DEFAULT_VERSION, VERSIONS, FRAME_TYPES, \
+                        SYN_STREAM, SYN_REPLY, RST_STREAM, SETTINGS, HEADERS, \
+                        WINDOW_UPDATE, FLAG_FIN, FLOW_CONTROL_ERROR, \
+                        INITIAL_WINDOW_SIZE
+from spdy.streams import Stream, DEFAULT_INITIAL_WINDOW_SIZE, MAX_WINDOW_SIZE
+from spdy.stats import Counters, DATA_INDEX
+from spdy.codec import get_codec, encode_data_frame, encode_data_header, \
+                       CONTROL_HEADER, DATA_HEADER, \
+                       UINT32, UINT32_LE
 
 SERVER = 'SERVER'
 CLIENT = 'CLIENT'
 
-class SpdyProtocolError(Exception):
-    pass
+# Parsed input is dropped from the buffer once it's this big
+COMPACT_THRESHOLD = 64 * 1024
+
+# Larger DATA payloads are sent as several frames
+MAX_FRAME_SIZE = 16 * 1024
+
+# WINDOW_UPDATE is sent once a stream has consumed this fraction of the
+# initial receive window
+WINDOW_UPDATE_THRESHOLD = 0.5
 
 def _bitmask(length, split, mask=0):
     invert = 1 if mask == 0 else 0
@@ -17,63 +34,80 @@ def _bitmask(length, split, mask=0):
 
 _first_bit = _bitmask(8, 1, 1)
 _last_15_bits = _bitmask(16, 1, 0)
+_last_24_bits = _bitmask(24, 0, 0)
 _last_31_bits = _bitmask(32, 1, 0)
 
-if version_info[0:2] < (3,2):
-    import struct
-    def get_struct_params(str_length, byte_order):
-        """ Guess pack integer format, for unsigned 1 to 4-Byte int byte-strings """
-        pad_before, pad_after = 0, 0
-        endianess = '>' if byte_order == 'big' else '<'
-        if str_length == 1:
-            int_format = 'B'
-        elif str_length == 2:
-            int_format = 'H'
-        elif str_length <= 4:
-            int_format = 'L'
-            if str_length == 3:
-                if endianess == '>':
-                    pad_before = 1
-                else:
-                    pad_after = 1
-        else:
-            raise ValueError('String length exceeds 4 Bytes long')
-        return (endianess + int_format, pad_before, pad_after)
-
-    def get_int_from_stream(stream, byte_order):
-        length_fmt, pad_before, pad_after = get_struct_params(len(stream), 
-                                                              byte_order)
-        stream = str(stream)
-        return struct.unpack(length_fmt, '\x00' * pad_before + stream + 
-                                         '\x00' * pad_after)[0]
-    
-    def get_stream_from_int(int_value, length, byte_order):
-        length_fmt, pad_before, pad_after = get_struct_params(length, byte_order)
-        packed_int = struct.pack(length_fmt, int_value)
-        if pad_before > 0:
-            packed_int = packed_int[pad_before:]
-        if pad_after > 0:
-            packed_int = packed_int[:-pad_after]
-        return packed_int
-else:
-    def get_int_from_stream(stream, byte_order):
-        return int.from_bytes(stream, byte_order)
-    def get_stream_from_int(int_value, length, byte_order):
-        return int_value.to_bytes(length, byte_order)
-
 
 class Context(object):
-    def __init__(self, side, version=DEFAULT_VERSION):
+    def __init__(self, side, version=DEFAULT_VERSION, zero_copy=False,
+                 compression=None, header_cache=None,
+                 compression_level=DEFAULT_LEVEL, window_bits=DEFAULT_WINDOW_BITS,
+                 mem_level=DEFAULT_MEM_LEVEL,
+                 window_update_threshold=WINDOW_UPDATE_THRESHOLD,
+                 max_frame_size=MAX_FRAME_SIZE, auto_consume=True):
         if side not in (SERVER, CLIENT):
             raise TypeError("side must be SERVER or CLIENT")
 
         if not version in VERSIONS:
             raise NotImplementedError()
+        if not 0 < max_frame_size <= _last_24_bits:
+            raise ValueError("max_frame_size must be between 1 and 2^24-1")
+        if not 0 < window_update_threshold <= 1:
+            #past the whole window, the peer would stall before any update
+            raise ValueError("window_update_threshold must be a fraction of the "
+                             "window, above 0 and at most 1")
         self.version = version
-        self.frame_queue = []
+        self.frame_queue = deque()
         self.input_buffer = bytearray()
-        self.inflater = Inflater(version)
-        self.deflater = Deflater(version)
+        # input_buffer[:_input_offset] is already parsed; it's dropped when
+        # the whole buffer is consumed, or by incoming() once it grows past
+        # compact_threshold bytes
+        self._input_offset = 0
+        self.compact_threshold = COMPACT_THRESHOLD
+        # frames parsed in a batch by iter_frames() but not handed out yet,
+        # and the SpdyProtocolError that ended the batch, if any
+        self._parsed = deque()
+        self._parse_error = None
+        # zero_copy: DataFrame.data is a memoryview into input_buffer instead
+        # of a copy. It's valid until the frame's release() method is called;
+        # the Context never overwrites bytes a view points to, and moves on to
+        # a new buffer instead, so the old one is freed once all its frames
+        # are released (or garbage collected).
+        self.zero_copy = zero_copy
+        # compression: header compression backend, see spdy.compression.
+        # compression_level, window_bits and mem_level tune the deflater
+        # (the memory it uses, see spdy.compression.PRESETS). Each zlib
+        # stream is only created along with the first headers going its way.
+        self._inflater_cls, self._deflater_cls = get_backend(compression)
+        self._deflater_options = (compression_level, window_bits, mem_level)
+        self._inflater = None
+        self._deflater = None
+        self.closed = False
+        # streams: Stream objects by stream id, updated with every frame
+        # sent or received. Closed (or reset) streams are dropped.
+        self.streams = {}
+        # SPDY/3 flow control: initial stream windows, as set by the peer's
+        # SETTINGS (send) and by ours (receive). Consumed DATA is acknowledged
+        # with WINDOW_UPDATE once it adds up to window_update_threshold times
+        # the initial receive window. With auto_consume, DATA is consumed as
+        # soon as it's parsed; otherwise the application reports it with
+        # consume(), so a peer can't send more than a reader keeps up with.
+        self.initial_send_window = DEFAULT_INITIAL_WINDOW_SIZE
+        self.initial_recv_window = DEFAULT_INITIAL_WINDOW_SIZE
+        self.window_update_threshold = window_update_threshold
+        self.auto_consume = auto_consume
+        self.flow_control = version >= 3
+        # Streams with DATA to send, in round-robin order, by priority
+        self._active = {}
+        # max_frame_size: DATA payloads are split into frames this big at
+        # most, FIN is kept for the last one. The frames of one stream take
+        # turns with the other streams.
+        self.max_frame_size = max_frame_size
+        # header_cache: optional HeaderBlockCache (maybe shared with other
+        # Contexts) for the header sets of outgoing frames
+        self.header_cache = header_cache
+        # counters: frames, bytes and time of this session, see stats()
+        self.counters = Counters()
 
         if side == SERVER:
             self._stream_id = 2
@@ -82,6 +116,44 @@ class Context(object):
             self._stream_id = 1
             self._ping_id = 1
 
+    @property
+    def inflater(self):
+        if self._inflater is None:
+            if self.closed:
+                raise ValueError("Context is closed")
+            self._inflater = self._inflater_cls(self.version)
+        return self._inflater
+
+    @property
+    def deflater(self):
+        if self._deflater is None:
+            if self.closed:
+                raise ValueError("Context is closed")
+            self._deflater = self._deflater_cls(self.version, *self._deflater_options)
+        return self._deflater
+
+    def close(self):
+        """ Frees the zlib streams and buffers right away, instead of
+            waiting for the garbage collector. The Context can't be used
+            afterwards. """
+        self.closed = True
+        for stream in (self._inflater, self._deflater):
+            if stream is not None:
+                stream.close()
+        self._inflater = None
+        self._deflater = None
+        self.input_buffer = bytearray()
+        self._input_offset = 0
+        self._parsed.clear()
+        self.frame_queue.clear()
+        self.streams.clear()
+        self._active.clear()
+
+    def stats(self):
+        """ Returns a snapshot of the session's counters as a dict, see
+            spdy.stats """
+        return self.counters.snapshot()
+
     @property
     def next_stream_id(self):
         sid = self._stream_id
@@ -95,300 +167,526 @@ class Context(object):
         return pid
 
     def incoming(self, chunk):
-        self.input_buffer.extend(chunk)
+        if self._input_offset >= self.compact_threshold:
+            self._compact_input()
+        try:
+            self.input_buffer.extend(chunk)
+        except BufferError:
+            #zero_copy DATA frames still point into input_buffer
+            self._detach_input()
+            self.input_buffer.extend(chunk)
 
     def get_frame(self):
-        frame, bytes_parsed = self._parse_frame(self.input_buffer)
+        if self._parsed or self._parse_error is not None:
+            #left by iter_frames()
+            return next(self.iter_frames())
+        counters = self.counters
+        start = timer()
+        frame, bytes_parsed = self._parse_frame(self.input_buffer, self._input_offset)
         if bytes_parsed:
-            self.input_buffer = self.input_buffer[bytes_parsed:]
+            counters.parse_time += timer() - start
+            index = frame.frame_type if frame.is_control else DATA_INDEX
+            counters.frames_in[index] += 1
+            counters.frame_bytes_in[index] += bytes_parsed
+            if self.flow_control:
+                self._update_windows(frame, False)
+            self._update_stream(frame, False)
+            self._input_offset += bytes_parsed
+            if self._input_offset == len(self.input_buffer):
+                #everything was consumed, start over without copying anything
+                self._compact_input()
         return frame
 
+    def iter_frames(self):
+        """ Yields every complete frame in the input buffer, leaving any
+            trailing partial frame there for the next incoming() call.
+            Frames are parsed in batches, but each one is applied to the
+            streams only when it's yielded; the frames of a batch left when
+            the caller stops come first the next time. """
+        parsed = self._parsed
+        while True:
+            if not parsed:
+                if self._parse_error is None:
+                    self._parse_frames()
+                if not parsed:
+                    if self._parse_error is None:
+                        return
+                    exc, self._parse_error = self._parse_error, None
+                    raise exc
+            frame = parsed.popleft()
+            if self.flow_control:
+                self._update_windows(frame, False)
+            self._update_stream(frame, False)
+            yield frame
+
+    def _parse_frames(self):
+        """ Parses every complete frame in the input buffer into _parsed, as
+            one timed batch. A SpdyProtocolError is kept in _parse_error,
+            to be raised once the frames before it are handed out. """
+        parse = self._parse_frame
+        buffer = self.input_buffer
+        counters = self.counters
+        frames_in, frame_bytes_in = counters.frames_in, counters.frame_bytes_in
+        append = self._parsed.append
+        offset = self._input_offset
+        start = timer()
+        try:
+            while True:
+                frame, bytes_parsed = parse(buffer, offset)
+                if not bytes_parsed:
+                    break
+                offset += bytes_parsed
+                index = frame.frame_type if frame.is_control else DATA_INDEX
+                frames_in[index] += 1
+                frame_bytes_in[index] += bytes_parsed
+                append(frame)
+        except SpdyProtocolError as exc:
+            self._parse_error = exc
+        finally:
+            #the parsed frames are consumed, even if something else is raised
+            self._input_offset = offset
+        counters.parse_time += timer() - start
+        if self._input_offset == len(buffer):
+            self._compact_input()
+
+    def get_frames(self):
+        """ Returns a list with every complete frame in the input buffer.
+            On SpdyProtocolError, the frames parsed before the invalid one
+            are in the exception's `frames` attribute. """
+        frames = []
+        try:
+            for frame in self.iter_frames():
+                frames.append(frame)
+        except SpdyProtocolError as exc:
+            #they're already applied to the streams, they can't be parsed again
+            exc.frames = frames
+            raise
+        return frames
+
+    @property
+    def bytes_pending(self):
+        """ Number of buffered bytes not parsed yet, i.e. a partial frame """
+        return len(self.input_buffer) - self._input_offset
+
+    def _compact_input(self):
+        """ Drops the already parsed prefix of input_buffer """
+        try:
+            del self.input_buffer[:self._input_offset]
+            self._input_offset = 0
+        except BufferError:
+            #zero_copy DATA frames still point into input_buffer
+            self._detach_input()
+
+    def _detach_input(self):
+        """ Leaves input_buffer to the memoryviews still exported from it,
+            going on with a new buffer holding just the unparsed bytes """
+        self.input_buffer = self.input_buffer[self._input_offset:]
+        self._input_offset = 0
+
     def put_frame(self, frame):
         if not isinstance(frame, Frame):
             raise TypeError("frame must be a valid Frame object")
+        if not frame.is_control or frame.frame_type == HEADERS:
+            stream = self.streams.get(frame.stream_id)
+            #HEADERS only waits if it would overtake the stream's DATA
+            if stream is not None and (not frame.is_control or stream.pending):
+                if stream.pending is None:
+                    stream.pending = deque()
+                stream.pending.append(frame)
+                self._schedule_stream(stream)
+                return
+        elif self.flow_control:
+            self._update_windows(frame, True)
+        self._update_stream(frame, True)
+        if not frame.is_control:
+            #no stream to take turns with, all of its frames go in a row
+            while len(frame.data) > self.max_frame_size:
+                head, frame = self._split_data_frame(frame, self.max_frame_size)
+                self.frame_queue.append(head)
         self.frame_queue.append(frame)
 
-    def outgoing(self):
+    def _schedule_stream(self, stream):
+        """ Puts a stream with pending frames in line for outgoing() """
+        if stream.scheduled or not stream.pending:
+            return
+        if self.flow_control and stream.send_window <= 0 and not stream.pending[0].is_control \
+           and len(stream.pending[0].data):
+            #blocked, until WINDOW_UPDATE or SETTINGS open the window
+            return
+        stream.scheduled = True
+        try:
+            self._active[stream.priority].append(stream)
+        except KeyError:
+            self._active[stream.priority] = deque((stream,))
+
+    def _next_stream_frame(self, stream):
+        """ Takes the next frame a stream can send, or None. DATA bigger
+            than max_frame_size or the send window is split, the rest waits. """
+        pending = stream.pending
+        if not pending:
+            return None
+        frame = pending[0]
+        if frame.is_control:
+            pending.popleft()
+        else:
+            size = len(frame.data)
+            limit = self.max_frame_size
+            if self.flow_control and stream.send_window < limit:
+                limit = stream.send_window
+            if size and size > limit:
+                if limit <= 0:
+                    return None
+                frame, pending[0] = self._split_data_frame(frame, limit)
+                size = limit
+            else:
+                pending.popleft()
+            if self.flow_control:
+                stream.send_window -= size
+        self._update_stream(frame, True)
+        return frame
+
+    def _split_data_frame(self, frame, size):
+        """ Returns two DataFrames, with the first size bytes of frame's data
+            and with the rest. Only the second one keeps FLAG_FIN. """
+        data = memoryview(frame.data)
+        return (DataFrame(frame.stream_id, data[:size], frame.flags & ~FLAG_FIN),
+                DataFrame(frame.stream_id, data[size:], frame.flags))
+
+    def _scheduled_frames(self, max_bytes=None):
+        """ Yields the frames to send: every control frame first, in the
+            order they were put, then DATA by stream priority (0 first),
+            taking one frame from each stream of the same priority in turn,
+            until DATA frames add up to max_bytes. """
+        queue = self.frame_queue
+        while queue:
+            yield queue.popleft()
+
+        active = self._active
+        budget = max_bytes
+        for priority in sorted(active):
+            streams = active[priority]
+            while streams:
+                if budget is not None and budget <= 0:
+                    return
+                stream = streams.popleft()
+                frame = self._next_stream_frame(stream)
+                stream.scheduled = False
+                if frame is None:
+                    continue
+                self._schedule_stream(stream)
+                if budget is not None and not frame.is_control:
+                    budget -= 8 + len(frame.data)
+                yield frame
+            del active[priority]
+
+    def _update_windows(self, frame, local):
+        """ Applies a frame sent (local) or received to the SPDY/3 flow
+            control windows, queueing WINDOW_UPDATE as DATA is received """
+        if not frame.is_control:
+            #sent DATA is accounted for by _next_stream_frame()
+            stream = self.streams.get(frame.stream_id)
+            if stream is None:
+                return
+            size = len(frame.data)
+            stream.recv_window -= size
+            if stream.recv_window < 0:
+                self.put_frame(RstStream(frame.stream_id, FLOW_CONTROL_ERROR,
+                                         version=self.version))
+                return
+            #with FIN no more DATA is coming, no point in opening the window
+            if self.auto_consume and not frame.flags & FLAG_FIN:
+                self._consumed(stream, size)
+
+        elif frame.frame_type == WINDOW_UPDATE:
+            stream = self.streams.get(frame.stream_id)
+            if stream is None:
+                return
+            if local:
+                stream.recv_window += frame.delta_window_size
+                stream.recv_consumed = max(0, stream.recv_consumed - frame.delta_window_size)
+                return
+            stream.send_window += frame.delta_window_size
+            if stream.send_window > MAX_WINDOW_SIZE:
+                self.put_frame(RstStream(frame.stream_id, FLOW_CONTROL_ERROR,
+                                         version=self.version))
+                return
+            self._schedule_stream(stream)
+
+        elif frame.frame_type == SETTINGS and INITIAL_WINDOW_SIZE in frame.id_value_pairs:
+            size = frame.id_value_pairs[INITIAL_WINDOW_SIZE][1]
+            #the new size applies to the streams already open, too
+            if local:
+                delta = size - self.initial_recv_window
+                self.initial_recv_window = size
+                for stream in self.streams.values():
+                    stream.recv_window += delta
+                return
+            delta = size - self.initial_send_window
+            self.initial_send_window = size
+            for stream in list(self.streams.values()):
+                stream.send_window += delta
+                if delta > 0:
+                    self._schedule_stream(stream)
+
+    def consume(self, stream_id, size):
+        """ Reports size bytes of a stream's received DATA as consumed by
+            the application, when not auto_consume: the peer may send that
+            much more (a WINDOW_UPDATE is queued, see window_update_threshold).
+            Unknown or closed streams are ignored. """
+        stream = self.streams.get(stream_id)
+        if self.flow_control and stream is not None and not stream.remote_closed:
+            self._consumed(stream, size)
+
+    def _consumed(self, stream, size):
+        stream.recv_consumed += size
+        if stream.recv_consumed >= self.initial_recv_window * self.window_update_threshold:
+            self.frame_queue.append(WindowUpdate(stream.stream_id, stream.recv_consumed,
+                                                 version=self.version))
+            stream.recv_window += stream.recv_consumed
+            stream.recv_consumed = 0
+
+    def get_stream(self, stream_id):
+        """ Returns the Stream with that id, None if it's closed or unknown """
+        return self.streams.get(stream_id)
+
+    def _update_stream(self, frame, local):
+        """ Applies a frame sent (local) or received to its stream's state """
+        if frame.is_control:
+            frame_type = frame.frame_type
+            if frame_type == SYN_STREAM:
+                stream = Stream(frame.stream_id, frame.priority,
+                                self.initial_send_window, self.initial_recv_window)
+                if frame.unidirectional:
+                    #only the side opening the stream sends on it
+                    if local:
+                        stream.remote_closed = True
+                    else:
+                        stream.local_closed = True
+                self.streams[frame.stream_id] = stream
+            elif frame_type == RST_STREAM:
+                stream = self.streams.pop(frame.stream_id, None)
+                if stream is not None:
+                    #nothing more goes out on a reset stream
+                    stream.pending = None
+                return
+            elif frame_type != SYN_REPLY and frame_type != HEADERS:
+                return
+
+        if not frame.flags & FLAG_FIN:
+            return
+        stream = self.streams.get(frame.stream_id)
+        if stream is None:
+            return
+        if local:
+            stream.local_closed = True
+        else:
+            stream.remote_closed = True
+        if stream.local_closed and stream.remote_closed:
+            del self.streams[frame.stream_id]
+
+    def outgoing(self, max_bytes=None):
+        """ Returns the encoded frames to send, see _scheduled_frames() for
+            their order. max_bytes limits the DATA sent in this call, the
+            rest stays queued; control frames are never held back. """
+        start = timer()
+        frames_out, frame_bytes_out = self.counters.frames_out, self.counters.frame_bytes_out
         out = bytearray()
-        while len(self.frame_queue) > 0:
-            frame = self.frame_queue.pop(0)
-            out.extend(self._encode_frame(frame))
+        for frame in self._scheduled_frames(max_bytes):
+            length = len(out)
+            if frame.is_control:
+                out.extend(self._encode_frame(frame))
+                index = frame.frame_type
+            else:
+                out.extend(encode_data_header(frame))
+                out.extend(frame.data)
+                index = DATA_INDEX
+            frames_out[index] += 1
+            frame_bytes_out[index] += len(out) - length
+        self.counters.encode_time += timer() - start
         return out
 
-    def _parse_header_chunk(self, compressed_data, version):
-        # Zlib dictionary selection
-        chunk = self.inflater.decompress(compressed_data)
-        
-        length_size = 2 if version == 2 else 4
-        headers = {}
-
-        #first two bytes: number of pairs
-        num_values = get_int_from_stream(chunk[0:length_size], 'big')
-
-        #after that...
-        cursor = length_size
-        for _ in range(num_values):
-            #two/four bytes: length of name
-            name_length = get_int_from_stream(chunk[cursor:cursor+length_size], 'big')
-            cursor += length_size
-
-            #next name_length bytes: name
-            name = chunk[cursor:cursor+name_length].decode('UTF-8')
-            cursor += name_length
-
-            #two/four bytes: length of value
-            value_length = get_int_from_stream(chunk[cursor:cursor+length_size], 'big')
-            cursor += length_size
-
-            #next value_length bytes: value
-            value = chunk[cursor:cursor+value_length].decode('UTF-8')
-            cursor += value_length
-
-            if name_length == 0 or value_length == 0:
+    def outgoing_segments(self, max_bytes=None):
+        """ Like outgoing(), but returns a list of buffers to be written in
+            order, e.g. with socket.sendmsg(). Frame headers and control
+            frames are joined together, DATA payloads are memoryviews of the
+            original data and are never copied. """
+        start = timer()
+        frames_out, frame_bytes_out = self.counters.frames_out, self.counters.frame_bytes_out
+        segments = []
+        out = bytearray()
+        for frame in self._scheduled_frames(max_bytes):
+            length = len(out)
+            if frame.is_control:
+                out.extend(self._encode_frame(frame))
+                frames_out[frame.frame_type] += 1
+                frame_bytes_out[frame.frame_type] += len(out) - length
                 continue
-            if name in headers:
-                raise SpdyProtocolError("duplicate name in n/v block")
-            headers[name] = value
-
-        return headers
+            out.extend(encode_data_header(frame))
+            frames_out[DATA_INDEX] += 1
+            frame_bytes_out[DATA_INDEX] += 8 + len(frame.data)
+            if len(frame.data):
+                segments.append(out)
+                segments.append(memoryview(frame.data))
+                out = bytearray()
+        if out:
+            segments.append(out)
+        self.counters.encode_time += timer() - start
+        return segments
 
-    def _parse_settings_id_values_v2(self, number_of_entries, data):
+    def _parse_header_chunk(self, compressed_data, version):
+        # Decompression has to happen now, in frame order, as the zlib
+        # stream is shared by the whole session. Decoding can wait.
+        data = self.inflater.decompress(compressed_data)
+        self.counters.header_bytes_in += len(compressed_data)
+        self.counters.header_raw_bytes_in += len(data)
+        return HeaderBlock(data, version)
+
+    def _parse_settings_id_values_v2(self, number_of_entries, data, cursor=0):
         id_value_pairs = {}
-        cursor = 0
         for _ in range(number_of_entries):
-            # 3B = ID
-            id = get_int_from_stream(data[cursor:cursor+3], 'little')
-            cursor += 3
-            # 1B = ID_Flag
-            id_flag = get_int_from_stream(data[cursor:cursor+1], 'big')
-            cursor += 1
+            # 3B = ID (little endian), 1B = ID_Flag
+            id_and_flag = UINT32_LE.unpack_from(data, cursor)[0]
             # 4B = Value
-            value = get_int_from_stream(data[cursor:cursor+4], 'big')
-            cursor += 4
-            id_value_pairs[id] = (id_flag, value)
+            value = UINT32.unpack_from(data, cursor + 4)[0]
+            cursor += 8
+            id_value_pairs[id_and_flag & _last_24_bits] = (id_and_flag >> 24, value)
         return id_value_pairs
 
-    def _parse_settings_id_values_v3(self, number_of_entries, data):
+    def _parse_settings_id_values_v3(self, number_of_entries, data, cursor=0):
         id_value_pairs = {}
-        cursor = 0
         for _ in range(number_of_entries):
-            # 1B = ID_Flag
-            id_flag = get_int_from_stream(data[cursor:cursor+1], 'big')
-            cursor += 1
-            # 3B = ID
-            id = get_int_from_stream(data[cursor:cursor+3], 'big')
-            cursor += 3
+            # 1B = ID_Flag, 3B = ID
+            flag_and_id = UINT32.unpack_from(data, cursor)[0]
             # 4B = Value
-            value = get_int_from_stream(data[cursor:cursor+4], 'big')
-            cursor += 4
-            id_value_pairs[id] = (id_flag, value)
+            value = UINT32.unpack_from(data, cursor + 4)[0]
+            cursor += 8
+            id_value_pairs[flag_and_id & _last_24_bits] = (flag_and_id >> 24, value)
         return id_value_pairs
 
-    def _parse_frame(self, chunk):
-        if len(chunk) < 8:
+    def _parse_frame(self, chunk, offset=0):
+        """ Parses the frame found at chunk[offset:], returns a tuple with the
+            frame and its length in bytes, or (None, 0) if it's incomplete """
+        available = len(chunk) - offset
+        if available < 8:
             return (None, 0)
 
         #first bit: control or data frame?
-        control_frame = (chunk[0] & _first_bit == _first_bit)
+        control_frame = (chunk[offset] & _first_bit == _first_bit)
 
         if control_frame:
-            #second byte (and rest of first, after the first bit): spdy version
-            spdy_version = get_int_from_stream(chunk[0:2], 'big') & _last_15_bits
+            #first two bytes (minus the first bit): spdy version
+            #third and fourth byte: frame type
+            #fifth byte: flags, sixth to eighth bytes: length
+            spdy_version, frame_type, flags_length = CONTROL_HEADER.unpack_from(chunk, offset)
+            spdy_version &= _last_15_bits
             if spdy_version != self.version:
                 raise SpdyProtocolError("incorrect SPDY version")
 
-            #third and fourth byte: frame type
-            frame_type = get_int_from_stream(chunk[2:4], 'big')
             if not frame_type in FRAME_TYPES:
                 raise SpdyProtocolError("invalid frame type: {0}".format(frame_type))
 
-            #fifth byte: flags
-            flags = chunk[4]
-
-            #sixth, seventh and eighth bytes: length
-            length = get_int_from_stream(chunk[5:8], 'big')
+            flags = flags_length >> 24
+            length = flags_length & _last_24_bits
             frame_length = length + 8
-            if len(chunk) < frame_length:
+            if available < frame_length:
                 return (None, 0)
 
-            #the rest is data
-            data = chunk[8:frame_length]
-
-            bits = bitarray()
-            bits.frombytes(bytes(data))
             frame_cls = FRAME_TYPES[frame_type]
+            codec = get_codec(frame_cls, spdy_version)
+            if length < codec.size:
+                raise SpdyProtocolError("frame too short: {0}".format(frame_cls.__name__))
 
             args = {
                 'version': spdy_version,
                 'flags': flags
             }
 
-            for key, num_bits in frame_cls.definition(spdy_version):
-                if not key:
-                    bits = bits[num_bits:]
-                    continue
-
-                if num_bits == -1:
-                    value = bits
-                else:
-                    value = bits[:num_bits]
-                    bits = bits[num_bits:]
-
-                if key == 'headers': #headers are compressed
-                    args[key] = self._parse_header_chunk(value.tobytes(), self.version)
-                elif key == 'id_value_pairs':
-                    if self.version == 2:
-                        args[key] = self._parse_settings_id_values_v2(args['number_of_entries'], \
-                                                            value.tobytes())
-                    else:
-                        args[key] = self._parse_settings_id_values_v3(args['number_of_entries'], \
-                                                            value.tobytes())
+            #the rest is data
+            cursor = codec.decode(chunk, offset + 8, args)
+            end = offset + frame_length
+
+            if codec.tail == 'headers': #headers are compressed
+                args['headers'] = self._parse_header_chunk(memoryview(chunk)[cursor:end],
+                                                           self.version)
+            elif codec.tail == 'id_value_pairs':
+                if end - cursor < args['number_of_entries'] * 8:
+                    raise SpdyProtocolError("frame too short: {0}".format(frame_cls.__name__))
+                if self.version == 2:
+                    args['id_value_pairs'] = self._parse_settings_id_values_v2(
+                                                args['number_of_entries'], chunk, cursor)
                 else:
-                    #we have to pad values on the left, because bitarray will assume
-                    #that you want it padded from the right
-                    gap = len(value) % 8
-                    if gap:
-                        zeroes = bitarray(8 - gap)
-                        zeroes.setall(False)
-                        value = zeroes + value
-                    args[key] = get_int_from_stream(value.tobytes(), 'big')
-
-                if num_bits == -1:
-                    break
+                    args['id_value_pairs'] = self._parse_settings_id_values_v3(
+                                                args['number_of_entries'], chunk, cursor)
 
             frame = frame_cls(**args)
 
         else: #data frame
             #first four bytes, except the first bit: stream_id
-            stream_id = get_int_from_stream(chunk[0:4], 'big') & _last_31_bits
-
-            #fifth byte: flags
-            flags = chunk[4]
-
-            #sixth, seventh and eight bytes: length
-            length = get_int_from_stream(chunk[5:8], 'big')
+            #fifth byte: flags, sixth to eighth bytes: length
+            stream_id, flags_length = DATA_HEADER.unpack_from(chunk, offset)
+            stream_id &= _last_31_bits
+            flags = flags_length >> 24
+            length = flags_length & _last_24_bits
             frame_length = 8 + length
-            if len(chunk) < frame_length:
-                return (0, None)
+            if available < frame_length:
+                return (None, 0)
 
-            data = chunk[8:frame_length]
-            frame = DataFrame(stream_id, data)
+            if self.zero_copy:
+                data = memoryview(chunk)[offset+8:offset+frame_length]
+            else:
+                data = chunk[offset+8:offset+frame_length]
+            frame = DataFrame(stream_id, data, flags)
 
         return (frame, frame_length)
 
     def _encode_header_chunk(self, headers, version):
-        chunk = bytearray()
-        length_size = 2 if version == 2 else 4
-        
-        #first two bytes: number of pairs
-        chunk.extend(get_stream_from_int(len(headers), length_size, 'big'))
-
-        #after that...
-        for name, value in headers.items():
-            name = bytes(name.encode('utf-8'))
-            value = bytes(value.encode('utf-8'))
-
-            #two bytes: length of name
-            chunk.extend(get_stream_from_int(len(name), length_size, 'big'))
-
-            #next name_length bytes: name
-            chunk.extend(name)
-
-            #two bytes: length of value
-            chunk.extend(get_stream_from_int(len(value), length_size, 'big'))
-
-            #next value_length bytes: value
-            chunk.extend(value)
-            
-        return self.deflater.compress(bytes(chunk))
+        if isinstance(headers, HeaderBlock) and headers.version == version:
+            block = headers
+        elif isinstance(headers, HeaderBlock):
+            block = HeaderBlock.from_dict(headers.to_dict(), version)
+        elif self.header_cache is not None:
+            block = self.header_cache.get(headers, version)
+        else:
+            block = HeaderBlock.from_dict(headers, version)
+        compressed = self.deflater.compress(block.data)
+        self.counters.header_bytes_out += len(compressed)
+        self.counters.header_raw_bytes_out += len(block.data)
+        return compressed
 
     def _encode_settings_id_values_v2(self, id_values_dict):
-        chunk = bytearray()
+        chunk = bytearray(8 * len(id_values_dict))
+        cursor = 0
         for id, (id_flag, value) in id_values_dict.items():
-            # 3B = ID
-            chunk.extend(get_stream_from_int(id, 3, 'little'))
-            # 1B = ID_Flag
-            chunk.extend(get_stream_from_int(id_flag, 1, 'big'))
+            # 3B = ID (little endian), 1B = ID_Flag
+            UINT32_LE.pack_into(chunk, cursor, (id_flag << 24) | (id & _last_24_bits))
             # 4B = Value
-            chunk.extend(get_stream_from_int(value, 4, 'big'))
+            UINT32.pack_into(chunk, cursor + 4, value)
+            cursor += 8
         return bytes(chunk)
 
     def _encode_settings_id_values_v3(self, id_values_dict):
-        chunk = bytearray()
+        chunk = bytearray(8 * len(id_values_dict))
+        cursor = 0
         for id, (id_flag, value) in id_values_dict.items():
-            # 1B = ID_Flag
-            chunk.extend(get_stream_from_int(id_flag, 1, 'big'))
-            # 3B = ID
-            chunk.extend(get_stream_from_int(id, 3, 'big'))
+            # 1B = ID_Flag, 3B = ID
+            UINT32.pack_into(chunk, cursor, (id_flag << 24) | (id & _last_24_bits))
             # 4B = Value
-            chunk.extend(get_stream_from_int(value, 4, 'big'))
+            UINT32.pack_into(chunk, cursor + 4, value)
+            cursor += 8
         return bytes(chunk)
 
     def _encode_frame(self, frame):
-        out = bytearray()
-
-        if frame.is_control:
-            #first two bytes: version
-            out.extend(get_stream_from_int(frame.version, 2, 'big'))
-
-            #set the first bit to control
-            out[0] = out[0] | _first_bit
-
-            #third and fourth: frame type
-            out.extend(get_stream_from_int(frame.frame_type, 2, 'big'))
-
-            #fifth: flags
-            out.append(frame.flags)
-
-            bits = bitarray()
-            for key, num_bits in frame.definition(self.version):
-
-                if not key: # is False
-                    zeroes = bitarray(num_bits)
-                    zeroes.setall(False)
-                    bits += zeroes
-                    continue
-
-                value = getattr(frame, key)
-                if key == 'headers':
-                    chunk = bitarray()
-                    chunk.frombytes(self._encode_header_chunk(value, frame.version))
-                elif key == 'id_value_pairs':
-                    chunk = bitarray()
-                    if frame.version == 2:
-                        chunk_content = self._encode_settings_id_values_v2(value)
-                    else:
-                        chunk_content = self._encode_settings_id_values_v3(value)
-                    chunk.frombytes(chunk_content)
-                else:
-                    chunk = bitarray(bin(value)[2:])
-                    zeroes = bitarray(num_bits - len(chunk))
-                    zeroes.setall(False)
-                    chunk = zeroes + chunk #pad with zeroes
-
-                bits += chunk
-                if num_bits == -1:
-                    break
-            data = bits.tobytes()
-
-            #sixth, seventh and eighth bytes: length
-            out.extend(get_stream_from_int(len(data), 3, 'big'))
-            # the rest is data
-            out.extend(data)
-
-        else: #data frame
-
-            #first four bytes: stream_id
-            out.extend(get_stream_from_int(frame.stream_id, 4, 'big'))
-
-            #fifth: flags
-            out.append(frame.flags)
-
-            #sixth, seventh and eighth bytes: length
-            data_length = len(frame.data)
-            out.extend(get_stream_from_int(data_length, 3, 'big'))
-
-            #rest is data
-            out.extend(frame.data)
-
-        return out
+        if not frame.is_control:
+            return encode_data_frame(frame)
+
+        codec = get_codec(frame.__class__, self.version)
+        if codec.tail == 'headers':
+            tail = self._encode_header_chunk(frame.raw_headers, frame.version)
+        elif codec.tail == 'id_value_pairs':
+            if frame.version == 2:
+                tail = self._encode_settings_id_values_v2(frame.id_value_pairs)
+            else:
+                tail = self._encode_settings_id_values_v3(frame.id_value_pairs)
+        else:
+            tail = b''
+        return codec.encode(frame, tail)
@@ -1,5 +1,9 @@
 # coding: utf-8
 """ Framing definition for SPDY protocol v2/v3, incomplete & unstable ATM. """
+from collections import OrderedDict
+from struct import error as struct_error
+from spdy.codec import NV_LENGTH
+
 DEFAULT_VERSION = 3
 VERSIONS = [2, 3]
 
@@ -91,6 +95,9 @@ GOAWAY_STATUS = {
 class InvalidFrameError(Exception):
     pass
 
+class SpdyProtocolError(Exception):
+    pass
+
 #definition format
 #definition = [
 #   (attr or value, num_bits)
@@ -99,9 +106,118 @@ class InvalidFrameError(Exception):
 # false for attr means ignore, string means that attribute, int means value
 # -1 for num_bits means 'until the end'
 
+class HeaderBlock(object):
+    """ Uncompressed Name/Value header block, as received in a SYN_STREAM,
+        SYN_REPLY or HEADERS frame. Names and values are only decoded when
+        they're looked up, either one at a time with get() or all at once
+        with to_dict(). """
+
+    __slots__ = ('data', 'version')
+
+    def __init__(self, data, version=DEFAULT_VERSION):
+        self.data = data
+        self.version = version
+
+    @classmethod
+    def from_dict(cls, headers, version=DEFAULT_VERSION):
+        """ Serializes a dict of headers into a new HeaderBlock. It can be
+            given as the headers of any number of frames, which then skip
+            serialization and only compress it. """
+        pack = NV_LENGTH[version].pack
+        #first two/four bytes: number of pairs
+        parts = [pack(len(headers))]
+        for name, value in headers.items():
+            name = name.encode('UTF-8')
+            value = value.encode('UTF-8')
+            #two/four bytes: length of name, then the name
+            #two/four bytes: length of value, then the value
+            parts.extend((pack(len(name)), name, pack(len(value)), value))
+        #join() sizes the whole block first and allocates it once
+        return cls(b''.join(parts), version)
+
+    def _pairs(self):
+        """ Yields (name_start, name_end, value_start, value_end) offsets of
+            every pair, skipping those with an empty name or value """
+        data = self.data
+        length_struct = NV_LENGTH[self.version]
+        unpack_from = length_struct.unpack_from
+        length_size = length_struct.size
+        try:
+            num_values = unpack_from(data, 0)[0]
+            cursor = length_size
+            for _ in range(num_values):
+                name_length = unpack_from(data, cursor)[0]
+                cursor += length_size
+                name_end = cursor + name_length
+                value_length = unpack_from(data, name_end)[0]
+                value_start = name_end + length_size
+                value_end = value_start + value_length
+                if value_end > len(data):
+                    raise SpdyProtocolError("truncated n/v block")
+                if name_length and value_length:
+                    yield (cursor, name_end, value_start, value_end)
+                cursor = value_end
+        except struct_error:
+            raise SpdyProtocolError("truncated n/v block")
+
+    def get(self, name, default=None):
+        """ Returns the value of a single header, decoding nothing else """
+        data = self.data
+        name = name.encode('UTF-8')
+        name_length = len(name)
+        for name_start, name_end, value_start, value_end in self._pairs():
+            if name_end - name_start == name_length and \
+               data[name_start:name_end] == name:
+                return data[value_start:value_end].decode('UTF-8')
+        return default
+
+    def to_dict(self):
+        data = self.data
+        headers = {}
+        for name_start, name_end, value_start, value_end in self._pairs():
+            name = data[name_start:name_end].decode('UTF-8')
+            if name in headers:
+                raise SpdyProtocolError("duplicate name in n/v block")
+            headers[name] = data[value_start:value_end].decode('UTF-8')
+        return headers
+
+class HeaderBlockCache(object):
+    """ Bounded LRU cache of serialized header blocks, keyed by header set.
+
+    A Context given one (see its header_cache argument) serializes each
+    distinct set of headers only once; only the compression, which
+    depends on the connection state, runs for every frame. A single cache
+    can be shared by many Contexts.
+    """
+
+    def __init__(self, maxsize=128):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._blocks = OrderedDict()
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def get(self, headers, version=DEFAULT_VERSION):
+        """ Returns the HeaderBlock for a dict of headers, serializing it
+            only if it's not cached """
+        key = (version, frozenset(headers.items()))
+        blocks = self._blocks
+        block = blocks.pop(key, None)
+        if block is None:
+            block = HeaderBlock.from_dict(headers, version)
+            if len(blocks) >= self.maxsize:
+                blocks.popitem(last=False)
+        blocks[key] = block
+        return block
+
+    def clear(self):
+        self._blocks.clear()
+
 #for isinstance(f, Frame) =)
 class Frame(object):
-    pass
+    __slots__ = ()
 
 class DataFrame(Frame):
     """
@@ -114,16 +230,28 @@ class DataFrame(Frame):
     +----------------------------------+
     """
 
+    __slots__ = ('stream_id', 'data', 'flags')
+    is_control = False
+
     def __init__(self, stream_id, data, flags=FLAG_FIN):
-        self.is_control = False
         self.stream_id = stream_id
         self.data = data
         self.flags = flags
-        self.fin = (flags & FLAG_FIN == FLAG_FIN)
+
+    @property
+    def fin(self):
+        return (self.flags & FLAG_FIN == FLAG_FIN)
 
     def __repr__(self):
         return 'DATA ({0}) id={1}'.format(len(self.data), self.stream_id)
 
+    def release(self):
+        """ Releases data if it's a memoryview into a Context's input buffer
+            (zero_copy mode), so the buffer can be reused. data can't be
+            accessed afterwards. """
+        if isinstance(self.data, memoryview):
+            self.data.release()
+
 class ControlFrame(Frame):
     """
     +----------------------------------+
@@ -135,8 +263,10 @@ class ControlFrame(Frame):
     +----------------------------------+
     """
 
+    __slots__ = ('frame_type', 'flags', 'version')
+    is_control = True
+
     def __init__(self, frame_type, flags=0, version=DEFAULT_VERSION):
-        self.is_control = True
         self.frame_type = frame_type
         self.flags = flags
         self.version = version
@@ -148,7 +278,38 @@ class ControlFrame(Frame):
     def definition(cls, version=DEFAULT_VERSION):
         return cls._definition
 
-class SynStream(ControlFrame):
+class NameValueFrame(ControlFrame):
+    """ Base for control frames carrying a Name/Value header block.
+
+    headers can be given as a dict or as a HeaderBlock. A HeaderBlock (what
+    Context hands out for received frames) is decoded into a dict the
+    first time headers is accessed; get_header() looks up a single header
+    without decoding the rest of the block.
+    """
+
+    __slots__ = ('_headers',)
+
+    @property
+    def headers(self):
+        headers = self._headers
+        if isinstance(headers, HeaderBlock):
+            headers = self._headers = headers.to_dict()
+        return headers
+
+    @headers.setter
+    def headers(self, headers):
+        self._headers = headers
+
+    @property
+    def raw_headers(self):
+        """ headers as they were given: a dict, or a HeaderBlock that may
+            not have been decoded yet """
+        return self._headers
+
+    def get_header(self, name, default=None):
+        return self._headers.get(name, default)
+
+class SynStream(NameValueFrame):
     """
     +----------------------------------+
     |1|   version = 2  |      1        |
@@ -203,6 +364,8 @@ class SynStream(ControlFrame):
    |           (repeats)                |
     """
 
+    __slots__ = ('stream_id', 'assoc_stream_id', 'priority', 'slot')
+
     @staticmethod
     def definition(version=DEFAULT_VERSION):
         if version == 2:
@@ -228,13 +391,19 @@ class SynStream(ControlFrame):
         self.headers = headers
         self.priority = priority
         self.slot = slot
-        self.fin = (flags & FLAG_FIN == FLAG_FIN)
-        self.unidirectional = (flags & FLAG_UNID == FLAG_UNID)
+
+    @property
+    def fin(self):
+        return (self.flags & FLAG_FIN == FLAG_FIN)
+
+    @property
+    def unidirectional(self):
+        return (self.flags & FLAG_UNID == FLAG_UNID)
 
     def __repr__(self):
         return 'SYN_STREAM v{0} id={1}'.format(self.version, self.stream_id)
 
-class SynReply(ControlFrame):
+class SynReply(NameValueFrame):
     """
     +----------------------------------+
     |1|   version = 2  |      2        |
@@ -261,6 +430,8 @@ class SynReply(ControlFrame):
     +----------------------------------+
     """
 
+    __slots__ = ('stream_id',)
+
     @staticmethod
     def definition(version=DEFAULT_VERSION):
         if version == 2:
@@ -279,7 +450,10 @@ class SynReply(ControlFrame):
         super(SynReply, self).__init__(SYN_REPLY, flags, version)
         self.stream_id = stream_id
         self.headers = headers
-        self.fin = (flags & FLAG_FIN == FLAG_FIN)
+
+    @property
+    def fin(self):
+        return (self.flags & FLAG_FIN == FLAG_FIN)
 
     def __repr__(self):
         return 'SYN_REPLY v{0} id={1}'.format(self.version, self.stream_id)
@@ -297,6 +471,8 @@ class RstStream(ControlFrame):
     +----------------------------------+
     """
 
+    __slots__ = ('stream_id', 'error_code')
+
     _definition = [
         (False, 1), ('stream_id', 31),
         ('error_code', 32)
@@ -339,6 +515,8 @@ class Settings(ControlFrame):
     
     """
 
+    __slots__ = ('number_of_entries', 'id_value_pairs')
+
     _definition = [
         ('number_of_entries', 32),
         ('id_value_pairs', -1)
@@ -346,10 +524,13 @@ class Settings(ControlFrame):
 
     def __init__(self, number_of_entries, id_value_pairs, flags=0, version=DEFAULT_VERSION):
         super(Settings, self).__init__(SETTINGS, flags, version)
-        self.clear_persisted = (flags & CLEAR_SETTINGS == CLEAR_SETTINGS)
         self.number_of_entries = number_of_entries
         self.id_value_pairs = id_value_pairs
 
+    @property
+    def clear_persisted(self):
+        return (self.flags & CLEAR_SETTINGS == CLEAR_SETTINGS)
+
     def __repr__(self):
         out = ''
         for id, (id_flag, value) in self.id_value_pairs.items():
@@ -368,6 +549,8 @@ class Ping(ControlFrame):
     +----------------------------------+
     """
 
+    __slots__ = ('uniq_id',)
+
     _definition = [
         ('uniq_id', 32)
     ]
@@ -399,6 +582,8 @@ class Goaway(ControlFrame):
     +----------------------------------+
     """
 
+    __slots__ = ('last_stream_id', 'status_code')
+
     @staticmethod
     def definition(version=DEFAULT_VERSION):
         if version == 2:
@@ -420,7 +605,7 @@ class Goaway(ControlFrame):
         status = GOAWAY_STATUS.get(self.status_code, '')
         return 'GOAWAY v{0} {1}'.format(self.version, status)
 
-class Headers(ControlFrame):
+class Headers(NameValueFrame):
     """
     +----------------------------------+
     |1|   version = 2  |      8        |
@@ -446,6 +631,8 @@ class Headers(ControlFrame):
     +----------------------------------+
     """
 
+    __slots__ = ('stream_id',)
+
     @staticmethod
     def definition(version=DEFAULT_VERSION):
         if version == 2:
@@ -462,7 +649,7 @@ class Headers(ControlFrame):
 
 
     def __init__(self, stream_id, headers, flags=0, version=DEFAULT_VERSION):
-        super(Headers, self).__init__(HEADERS, 0, version)
+        super(Headers, self).__init__(HEADERS, flags, version)
         self.stream_id = stream_id
         self.headers = headers
 
@@ -483,6 +670,8 @@ class WindowUpdate(ControlFrame):
     +----------------------------------+
     """
 
+    __slots__ = ('stream_id', 'delta_window_size')
+
     _definition = [
         (False, 1), ('stream_id', 31),
         (False, 1), ('delta_window_size', 31)
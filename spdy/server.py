@@ -0,0 +1,259 @@
+# coding: utf-8
+""" SPDY server on asyncio (Python 3.7+), see spdy.aio.
+
+    The application is a handler called for every stream with its request
+    headers and body, returning the response headers and body:
+
+        def hello(headers, body):
+            return {':status': '200 OK', ':version': 'HTTP/1.1'}, b'hello'
+
+        serve(hello, port=9599)
+
+    The handler may be a coroutine function, and the body it returns either
+    bytes or an iterable of bytes, written as they come.
+
+    serve(..., workers=4) forks 4 worker processes, each with its own event
+    loop and Contexts, accepting connections on the same port.
+
+    Handlers run on the event loop, between frames. Blocking ones should
+    go to a thread pool instead, with threads=N (or executor=...), so the
+    session goes on answering PINGs and serving the other streams.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from spdy.aio import SpdyProtocol, READ_SIZE
+from spdy.context import SERVER
+from spdy.frames import DEFAULT_VERSION
+
+# Seconds shutdown() waits for open streams before closing connections
+SHUTDOWN_TIMEOUT = 10.0
+
+# Marks the end of a response body iterated in the executor
+_END = object()
+
+# A worker that dies sooner than this after starting is restarted this
+# late, so a broken one doesn't keep the supervisor forking
+RESTART_DELAY = 1.0
+
+
+class SpdyServer(object):
+    """ Serves handler on every connection accepted, any number of them,
+        each with any number of concurrent streams. read_size is the size
+        of the reads from each connection; ssl an ssl.SSLContext (with
+        'spdy/3' or 'spdy/2' in its NPN or ALPN protocols).
+
+        With threads > 0, handlers run in a pool of that many threads
+        (created by start(), shut down by shutdown()), as does the iteration
+        of the bodies they return; executor is a concurrent.futures.Executor
+        to use instead. Their results go back to the event loop, the only
+        thread touching the Contexts. Other keyword arguments are passed on
+        to every Context. """
+
+    def __init__(self, handler, version=DEFAULT_VERSION, read_size=READ_SIZE,
+                 ssl=None, threads=0, executor=None, **context_options):
+        self.handler = handler
+        self.version = version
+        self.read_size = read_size
+        self.ssl = ssl
+        self.threads = threads
+        self.executor = executor
+        self._own_executor = False
+        self.context_options = context_options
+        self.sessions = set()
+        self.server = None
+        self._tasks = set()
+
+    def _protocol_factory(self):
+        protocol = SpdyProtocol(SERVER, self.version, on_stream=self._stream_received,
+                                read_size=self.read_size, **self.context_options)
+        self.sessions.add(protocol)
+        protocol.closed.add_done_callback(lambda _: self.sessions.discard(protocol))
+        return protocol
+
+    async def start(self, host=None, port=0, sock=None, **options):
+        """ Starts listening, on host and port or on the socket sock. Other
+            keyword arguments go to loop.create_server(). """
+        loop = asyncio.get_event_loop()
+        if self.executor is None and self.threads > 0:
+            #created here, not before serve() forks the workers
+            self.executor = ThreadPoolExecutor(self.threads)
+            self._own_executor = True
+        if sock is not None:
+            self.server = await loop.create_server(self._protocol_factory, sock=sock,
+                                                   ssl=self.ssl, **options)
+        else:
+            self.server = await loop.create_server(self._protocol_factory, host, port,
+                                                   ssl=self.ssl, **options)
+        return self
+
+    @property
+    def sockets(self):
+        return self.server.sockets if self.server is not None else ()
+
+    async def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """ Stops accepting connections, sends GOAWAY on every session and
+            lets its open streams finish, handlers done and responses sent
+            (the peer's flow control may hold them back), waiting up to
+            timeout seconds in all, then closes all the connections. """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        if self.server is not None:
+            self.server.close()
+        for protocol in list(self.sessions):
+            protocol.send_goaway()
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+        #a handler is done once its response is queued, not sent
+        idle = [asyncio.ensure_future(protocol.wait_idle()) for protocol in self.sessions]
+        if idle:
+            _, pending = await asyncio.wait(idle, timeout=max(0, deadline - loop.time()))
+            for waiter in pending:
+                waiter.cancel()
+        for protocol in list(self.sessions):
+            protocol.close()
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+        if self.server is not None:
+            await self.server.wait_closed()
+
+    def _stream_received(self, stream):
+        task = asyncio.ensure_future(self._handle(stream))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _handle(self, stream):
+        body = await stream.read()
+        executor = self.executor
+        if executor is None:
+            result = self.handler(stream.headers, body)
+        else:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(executor, self.handler, stream.headers, body)
+        if asyncio.iscoroutine(result):
+            result = await result
+        headers, body = result
+
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            stream.reply(headers, fin=not body)
+            if body:
+                stream.write(body, fin=True)
+                await stream.drain()
+            return
+
+        stream.reply(headers)
+        chunks = iter(body)
+        while True:
+            if executor is None:
+                chunk = next(chunks, _END)
+            else:
+                chunk = await loop.run_in_executor(executor, next, chunks, _END)
+            if chunk is _END:
+                break
+            stream.write(chunk)
+            await stream.drain()
+        stream.write_eof()
+        await stream.drain()
+
+
+def serve(handler, host=None, port=9599, workers=1, shutdown_timeout=SHUTDOWN_TIMEOUT,
+          **options):
+    """ Runs a SpdyServer until SIGINT or SIGTERM, then shuts it down.
+        With workers > 1 (Unix only), forks that many processes running
+        one each; they listen with SO_REUSEPORT where there is one, so the
+        kernel spreads the connections, or accept from a shared socket.
+        This process supervises them, starting a new one for every worker
+        that dies, and passes SIGINT and SIGTERM on to them. Other keyword
+        arguments are the ones of SpdyServer. """
+    if workers <= 1:
+        _run(handler, shutdown_timeout, options, host=host, port=port)
+        return
+
+    if hasattr(socket, 'SO_REUSEPORT'):
+        listen = {'host': host, 'port': port, 'reuse_port': True}
+        sock = None
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host or '', port))
+        sock.listen(socket.SOMAXCONN)
+        listen = {'sock': sock}
+    try:
+        _supervise(workers, lambda: _run(handler, shutdown_timeout, options, **listen))
+    finally:
+        if sock is not None:
+            sock.close()
+
+def _supervise(workers, run_worker):
+    """ Keeps `workers` child processes running run_worker(), until
+        SIGINT or SIGTERM """
+    children = {}
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    handlers = [(signum, signal.signal(signum, stop))
+                for signum in (signal.SIGINT, signal.SIGTERM)]
+    try:
+        while True:
+            while not stopping and len(children) < workers:
+                pid = os.fork()
+                if pid == 0:
+                    for signum, handler in handlers:
+                        signal.signal(signum, handler)
+                    _worker_main(run_worker)
+                children[pid] = time.time()
+            if not children:
+                break
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = children.pop(pid, None)
+            if not stopping and started is not None:
+                sys.stderr.write('SPDY worker {0} exited with status {1}\n'.format(pid, status))
+                if time.time() - started < RESTART_DELAY:
+                    time.sleep(RESTART_DELAY)
+    finally:
+        for signum, handler in handlers:
+            signal.signal(signum, handler)
+
+def _worker_main(run_worker):
+    """ Runs a forked worker, never returns to the supervisor's code """
+    status = 1
+    try:
+        run_worker()
+        status = 0
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+def _run(handler, shutdown_timeout, options, **listen):
+    """ Runs a SpdyServer on a new event loop, see serve() """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = SpdyServer(handler, **options)
+    loop.run_until_complete(server.start(**listen))
+    stop = loop.create_future()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, lambda: stop.done() or stop.set_result(None))
+    try:
+        loop.run_until_complete(stop)
+        loop.run_until_complete(server.shutdown(shutdown_timeout))
+    finally:
+        loop.close()
@@ -0,0 +1,104 @@
+# coding: utf-8
+""" Counters kept by every Context, and their totals for the whole process:
+
+        context.stats()     # this session
+        spdy.stats.totals() # every Context of the process, gone ones too
+
+    Both return a plain dict, ready for a metrics system:
+
+    frames_in, frames_out           frames by class name (DataFrame and the
+                                    classes of FRAME_TYPES)
+    frame_bytes_in/_out             bytes of those frames on the wire, by
+                                    class name
+    bytes_in, bytes_out             all frames, on the wire
+    data_bytes_in, data_bytes_out   DATA payloads
+    header_bytes_in/_out            name/value blocks, compressed
+    header_raw_bytes_in/_out        the same blocks, uncompressed; the
+                                    compression ratio is raw / compressed
+    parse_time                      seconds spent parsing received frames,
+                                    decompression included (header blocks
+                                    are decoded later, when read)
+    encode_time                     seconds spent in outgoing() and
+                                    outgoing_segments()
+
+    Counters only go up. Each process has its own totals, e.g. each worker
+    of spdy.server.serve().
+"""
+import weakref
+from spdy.frames import DataFrame, FRAME_TYPES
+
+# Frames are counted in lists indexed by frame type; DATA, which has none,
+# takes index 0
+DATA_INDEX = 0
+_FRAME_NAMES = [None] * (max(FRAME_TYPES) + 1)
+_FRAME_NAMES[DATA_INDEX] = DataFrame.__name__
+for _frame_type, _cls in FRAME_TYPES.items():
+    _FRAME_NAMES[_frame_type] = _cls.__name__
+del _frame_type, _cls
+
+_COUNTERS = ('header_bytes_in', 'header_bytes_out', 'header_raw_bytes_in',
+             'header_raw_bytes_out', 'parse_time', 'encode_time')
+
+_BY_TYPE = ('frames_in', 'frames_out', 'frame_bytes_in', 'frame_bytes_out')
+
+class Counters(object):
+    """ The counters of one Context, which updates them directly. Frames and
+        their bytes are counted by frame type (see _FRAME_NAMES), the other
+        counters of the snapshot come from these. """
+
+    __slots__ = _BY_TYPE + _COUNTERS + ('live', '__weakref__')
+
+    def __init__(self, live=True):
+        for name in _BY_TYPE:
+            setattr(self, name, [0] * len(_FRAME_NAMES))
+        for name in _COUNTERS:
+            setattr(self, name, 0)
+        # live: counts for a Context, added to the totals
+        self.live = live
+        if live:
+            _live.add(self)
+
+    def add(self, other):
+        for name in _BY_TYPE:
+            counts = getattr(self, name)
+            for index, count in enumerate(getattr(other, name)):
+                counts[index] += count
+        for name in _COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def snapshot(self):
+        """ Returns the counters as a dict, see the module's docstring """
+        stats = dict((name, getattr(self, name)) for name in _COUNTERS)
+        for name in _BY_TYPE:
+            stats[name] = dict((frame_name, count) for frame_name, count
+                               in zip(_FRAME_NAMES, getattr(self, name))
+                               if frame_name is not None)
+        for way in ('in', 'out'):
+            frame_bytes = getattr(self, 'frame_bytes_' + way)
+            data_frames = getattr(self, 'frames_' + way)[DATA_INDEX]
+            stats['bytes_' + way] = sum(frame_bytes)
+            #DATA frame headers are 8 bytes
+            stats['data_bytes_' + way] = frame_bytes[DATA_INDEX] - 8 * data_frames
+        return stats
+
+    def __del__(self):
+        #the Context is gone, its counts stay in the totals
+        if not self.live:
+            return
+        try:
+            _retired.add(self)
+        except Exception: # interpreter shutdown
+            pass
+
+# Counters of the live Contexts, and the sum of the others
+_live = weakref.WeakSet()
+_retired = Counters(live=False)
+
+def totals():
+    """ Returns the sum of the counters of every Context created in this
+        process so far, as a dict like Context.stats() """
+    total = Counters(live=False)
+    total.add(_retired)
+    for counters in list(_live):
+        total.add(counters)
+    return total.snapshot()
@@ -0,0 +1,60 @@
+# coding: utf-8
+""" Stream state for a SPDY session, driven by FIN flags and RST_STREAM. """
+
+# Stream states
+OPEN = 'OPEN'
+HALF_CLOSED_LOCAL = 'HALF_CLOSED_LOCAL'   # we've sent FIN, the peer may go on
+HALF_CLOSED_REMOTE = 'HALF_CLOSED_REMOTE' # the peer has sent FIN, we may go on
+CLOSED = 'CLOSED'
+
+# SPDY/3 flow control: initial window until SETTINGS says otherwise, and
+# the largest window allowed
+DEFAULT_INITIAL_WINDOW_SIZE = 64 * 1024
+MAX_WINDOW_SIZE = 0x7fffffff
+
+class Stream(object):
+    """ One stream of a Context. Both halves start open, each one closes
+        when a frame with FLAG_FIN goes its way (or right away for the
+        half that can't send in a unidirectional stream); RST_STREAM
+        closes both.
+
+        In SPDY/3 it also holds the flow control windows: send_window is
+        what the peer lets us send, recv_window what we let it send, and
+        recv_consumed what the application has consumed since our last
+        WINDOW_UPDATE.
+
+        Outgoing DATA waits in pending until the Context schedules it,
+        scheduled tells whether the stream is in line for that. """
+
+    __slots__ = ('stream_id', 'priority', 'local_closed', 'remote_closed',
+                 'send_window', 'recv_window', 'recv_consumed', 'pending',
+                 'scheduled')
+
+    def __init__(self, stream_id, priority=0,
+                 send_window=DEFAULT_INITIAL_WINDOW_SIZE,
+                 recv_window=DEFAULT_INITIAL_WINDOW_SIZE):
+        self.stream_id = stream_id
+        self.priority = priority
+        self.local_closed = False
+        self.remote_closed = False
+        self.send_window = send_window
+        self.recv_window = recv_window
+        self.recv_consumed = 0
+        self.pending = None
+        self.scheduled = False
+
+    @property
+    def pending_bytes(self):
+        """ DATA bytes queued and not sent yet """
+        if not self.pending:
+            return 0
+        return sum(len(frame.data) for frame in self.pending if not frame.is_control)
+
+    @property
+    def state(self):
+        if self.local_closed:
+            return CLOSED if self.remote_closed else HALF_CLOSED_LOCAL
+        return HALF_CLOSED_REMOTE if self.remote_closed else OPEN
+
+    def __repr__(self):
+        return 'STREAM id={0} {1}'.format(self.stream_id, self.state)
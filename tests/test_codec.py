@@ -0,0 +1,108 @@
+# coding: utf-8
+""" Frame encoding and decoding in Context: round trips of every frame
+    type, and values that don't fit their fields """
+import os
+import unittest
+from base64 import b64encode
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, SynReply, RstStream, Settings, Ping, Goaway, Headers, \
+                        WindowUpdate, DataFrame, FRAME_TYPES, FLAG_FIN, FLAG_UNID, \
+                        PROTOCOL_ERROR, CANCEL, MAX_CONCURRENT_STREAMS, INITIAL_WINDOW_SIZE, \
+                        PERSIST_NONE, PERSIST_VALUE, CLEAR_SETTINGS, GOAWAY_PROTOCOL_ERROR
+
+def fields(frame):
+    """ The values of every slot of a frame, headers decoded """
+    values = {}
+    for cls in type(frame).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            values[name] = getattr(frame, name, None)
+    if '_headers' in values:
+        values['_headers'] = frame.headers
+    if 'data' in values:
+        values['data'] = bytes(frame.data)
+    return values
+
+def frames(version):
+    """ One frame of every type, with fields that aren't all zero """
+    headers = ({':method': 'GET', ':path': '/', ':version': 'HTTP/1.1'} if version == 3
+               else {'method': 'GET', 'url': '/', 'version': 'HTTP/1.1'})
+    return [
+        DataFrame(7, b'hello', FLAG_FIN),
+        DataFrame(0x7fffffff, b'', 0),
+        SynStream(5, headers, priority=3 if version == 2 else 7, assoc_stream_id=2,
+                  slot=1 if version == 3 else 0, flags=FLAG_FIN | FLAG_UNID, version=version),
+        SynReply(5, {'status': '200 OK', 'content-type': 'text/html'}, flags=FLAG_FIN, version=version),
+        RstStream(5, CANCEL, version=version),
+        Settings(2, {MAX_CONCURRENT_STREAMS: (PERSIST_VALUE, 100),
+                     INITIAL_WINDOW_SIZE: (PERSIST_NONE, 0x7fffffff)},
+                 flags=CLEAR_SETTINGS, version=version),
+        Ping(0xffffffff, version=version),
+        Goaway(9, GOAWAY_PROTOCOL_ERROR if version == 3 else None, version=version),
+        Headers(5, {'x-trailer': 'yes'}, flags=FLAG_FIN, version=version),
+    ] + ([WindowUpdate(5, 0x7fffffff, version=version)] if version == 3 else [])
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def round_trip(self, version):
+        encoder = Context(CLIENT, version=version)
+        decoder = Context(SERVER, version=version)
+        for frame in frames(version):
+            data = encoder._encode_frame(frame)
+            parsed, length = decoder._parse_frame(data)
+            self.assertEqual(length, len(data))
+            self.assertIs(type(parsed), type(frame))
+            self.assertEqual(fields(parsed), fields(frame))
+            #and back to the same bytes, the header compression state aside
+            if not getattr(frame, 'headers', None):
+                self.assertEqual(encoder._encode_frame(parsed), data)
+
+    def test_spdy2(self):
+        self.round_trip(2)
+
+    def test_spdy3(self):
+        self.round_trip(3)
+
+    def test_every_frame_type(self):
+        for version in (2, 3):
+            tested = set(type(frame) for frame in frames(version))
+            self.assertTrue(tested >= set(FRAME_TYPES.values()) - set([WindowUpdate]))
+        self.assertIn(WindowUpdate, set(type(frame) for frame in frames(3)))
+
+    def test_partial_frame(self):
+        data = Context(CLIENT, version=3)._encode_frame(Ping(1, version=3))
+        for size in range(len(data)):
+            self.assertEqual(Context(SERVER, version=3)._parse_frame(data[:size]), (None, 0))
+
+
+class OversizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = Context(CLIENT, version=3)
+
+    def test_data_length(self):
+        frame = DataFrame(1, b'x' * (1 << 24), FLAG_FIN)
+        self.assertRaises(ValueError, self.context._encode_frame, frame)
+
+    def test_control_frame_length(self):
+        #base64 of random bytes compresses to about 3/4: a block over 16 MiB
+        headers = {'x-big': b64encode(os.urandom(24 << 20)).decode('ascii')}
+        frame = SynStream(1, headers, flags=FLAG_FIN, version=3)
+        self.assertRaises(ValueError, self.context._encode_frame, frame)
+
+    def test_fields(self):
+        for frame in (DataFrame(1 << 31, b'x', FLAG_FIN),
+                      RstStream(1 << 31, PROTOCOL_ERROR, version=3),
+                      RstStream(1, -1, version=3),
+                      SynStream(1, {'a': 'b'}, priority=8, version=3)):
+            self.assertRaises(ValueError, Context(SERVER, version=3)._encode_frame, frame)
+
+    def test_max_length(self):
+        frame = DataFrame(1, b'x' * ((1 << 24) - 1), FLAG_FIN)
+        server = Context(SERVER, version=3)
+        server.incoming(self.context._encode_frame(frame))
+        self.assertEqual(len(server.get_frame().data), (1 << 24) - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
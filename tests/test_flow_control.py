@@ -0,0 +1,158 @@
+# coding: utf-8
+""" SPDY/3 flow control in Context: send and receive windows, SETTINGS,
+    WINDOW_UPDATE and RST_STREAM on overruns """
+import unittest
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, DataFrame, Settings, WindowUpdate, RstStream, \
+                        FLAG_FIN, FLOW_CONTROL_ERROR, INITIAL_WINDOW_SIZE, PERSIST_NONE
+from spdy.streams import DEFAULT_INITIAL_WINDOW_SIZE, MAX_WINDOW_SIZE
+
+REQUEST = {':method': 'GET', ':path': '/', ':version': 'HTTP/1.1'}
+
+def exchange(sender, receiver):
+    """ Moves everything sender has to send to receiver, returns the frames
+        receiver parsed """
+    receiver.incoming(sender.outgoing())
+    return receiver.get_frames()
+
+def data_sent(frames):
+    return sum(len(frame.data) for frame in frames if not frame.is_control)
+
+def open_stream(client_options=None, server_options=None):
+    """ Returns a client and a server Context, and the id of a stream the
+        client opened, its request already sent """
+    client = Context(CLIENT, version=3, **(client_options or {}))
+    server = Context(SERVER, version=3, **(server_options or {}))
+    stream_id = client.next_stream_id
+    client.put_frame(SynStream(stream_id, REQUEST, flags=FLAG_FIN, version=3))
+    exchange(client, server)
+    return client, server, stream_id
+
+
+class FlowControlTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client, self.server, self.stream_id = open_stream()
+
+    def test_send_window_exhaustion_and_reopening(self):
+        self.server.put_frame(DataFrame(self.stream_id, b'x' * 100000, FLAG_FIN))
+        frames = exchange(self.server, self.client)
+        self.assertEqual(data_sent(frames), DEFAULT_INITIAL_WINDOW_SIZE)
+        self.assertFalse(any(frame.flags & FLAG_FIN for frame in frames))
+        self.assertEqual(self.server.get_stream(self.stream_id).send_window, 0)
+
+        #nothing more until the client opens the window
+        self.assertEqual(self.server.outgoing(), b'')
+        updates = exchange(self.client, self.server)
+        self.assertTrue(updates)
+        self.assertTrue(all(isinstance(frame, WindowUpdate) for frame in updates))
+        self.assertEqual(sum(frame.delta_window_size for frame in updates),
+                         DEFAULT_INITIAL_WINDOW_SIZE)
+
+        frames = exchange(self.server, self.client)
+        self.assertEqual(data_sent(frames), 100000 - DEFAULT_INITIAL_WINDOW_SIZE)
+        self.assertTrue(frames[-1].flags & FLAG_FIN)
+        self.assertIsNone(self.server.get_stream(self.stream_id))
+
+    def test_window_update_threshold(self):
+        half = int(DEFAULT_INITIAL_WINDOW_SIZE * self.client.window_update_threshold)
+        self.server.put_frame(DataFrame(self.stream_id, b'x' * (half - 1), 0))
+        exchange(self.server, self.client)
+        self.assertEqual(self.client.outgoing(), b'')
+
+        self.server.put_frame(DataFrame(self.stream_id, b'x', 0))
+        exchange(self.server, self.client)
+        updates = exchange(self.client, self.server)
+        self.assertEqual([(frame.stream_id, frame.delta_window_size) for frame in updates],
+                         [(self.stream_id, half)])
+        self.assertEqual(self.client.get_stream(self.stream_id).recv_window,
+                         DEFAULT_INITIAL_WINDOW_SIZE)
+
+    def test_invalid_window_update_threshold(self):
+        for threshold in (0, -0.5, 1.5):
+            self.assertRaises(ValueError, Context, CLIENT, window_update_threshold=threshold)
+        #a whole window at a time
+        client, server, stream_id = open_stream({'window_update_threshold': 1})
+        server.put_frame(DataFrame(stream_id, b'x' * 100000, FLAG_FIN))
+        exchange(server, client)
+        updates = exchange(client, server)
+        self.assertEqual([frame.delta_window_size for frame in updates],
+                         [DEFAULT_INITIAL_WINDOW_SIZE])
+
+    def test_no_window_update_after_fin(self):
+        client, server, stream_id = open_stream(server_options={'max_frame_size': 60000})
+        server.put_frame(DataFrame(stream_id, b'x' * 60000, FLAG_FIN))
+        exchange(server, client)
+        self.assertEqual(client.outgoing(), b'')
+
+    def test_consume(self):
+        client, server, stream_id = open_stream({'auto_consume': False})
+        server.put_frame(DataFrame(stream_id, b'x' * 200000, FLAG_FIN))
+        self.assertEqual(data_sent(exchange(server, client)), DEFAULT_INITIAL_WINDOW_SIZE)
+        #received, but not consumed: the window stays closed
+        self.assertEqual(client.outgoing(), b'')
+
+        client.consume(stream_id, 40000)
+        updates = exchange(client, server)
+        self.assertEqual([frame.delta_window_size for frame in updates], [40000])
+        self.assertEqual(data_sent(exchange(server, client)), 40000)
+
+    def test_recv_overrun_resets_stream(self):
+        client, server, stream_id = open_stream({'auto_consume': False})
+        #a peer ignoring the window
+        server.flow_control = False
+        server.put_frame(DataFrame(stream_id, b'x' * (DEFAULT_INITIAL_WINDOW_SIZE + 1), 0))
+        exchange(server, client)
+        resets = exchange(client, server)
+        self.assertEqual([(type(frame), frame.stream_id, frame.error_code) for frame in resets],
+                         [(RstStream, stream_id, FLOW_CONTROL_ERROR)])
+        self.assertIsNone(client.get_stream(stream_id))
+
+    def test_window_update_overflow_resets_stream(self):
+        stream = self.server.get_stream(self.stream_id)
+        self.server.incoming(Context(CLIENT, version=3)._encode_frame(
+            WindowUpdate(self.stream_id, MAX_WINDOW_SIZE - stream.send_window + 1, version=3)))
+        self.server.get_frames()
+        frames = exchange(self.server, self.client)
+        self.assertEqual([(type(frame), frame.error_code) for frame in frames],
+                         [(RstStream, FLOW_CONTROL_ERROR)])
+
+    def test_settings_initial_window_size(self):
+        client, server, stream_id = open_stream({'auto_consume': False})
+        server.put_frame(DataFrame(stream_id, b'x' * 100000, FLAG_FIN))
+        exchange(server, client)
+        stream = server.get_stream(stream_id)
+
+        #a smaller window applies to open streams too, the window goes negative
+        client.put_frame(Settings(1, {INITIAL_WINDOW_SIZE: (PERSIST_NONE, 1000)}, version=3))
+        exchange(client, server)
+        self.assertEqual(server.initial_send_window, 1000)
+        self.assertEqual(stream.send_window, 1000 - DEFAULT_INITIAL_WINDOW_SIZE)
+        self.assertEqual(server.outgoing(), b'')
+
+        #a bigger one lets the queued DATA out
+        client.put_frame(Settings(1, {INITIAL_WINDOW_SIZE: (PERSIST_NONE, 200000)}, version=3))
+        exchange(client, server)
+        self.assertEqual(stream.send_window, 200000 - DEFAULT_INITIAL_WINDOW_SIZE)
+        self.assertEqual(data_sent(exchange(server, client)),
+                         100000 - DEFAULT_INITIAL_WINDOW_SIZE)
+
+    def test_local_settings_update_recv_window(self):
+        self.client.put_frame(Settings(1, {INITIAL_WINDOW_SIZE: (PERSIST_NONE, 1000)},
+                                       version=3))
+        self.assertEqual(self.client.initial_recv_window, 1000)
+        self.assertEqual(self.client.get_stream(self.stream_id).recv_window, 1000)
+
+    def test_spdy2_has_no_flow_control(self):
+        client, server = Context(CLIENT, version=2), Context(SERVER, version=2)
+        stream_id = client.next_stream_id
+        client.put_frame(SynStream(stream_id, {'method': 'GET', 'url': '/'}, flags=FLAG_FIN,
+                                   version=2))
+        exchange(client, server)
+        server.put_frame(DataFrame(stream_id, b'x' * 100000, FLAG_FIN))
+        self.assertEqual(data_sent(exchange(server, client)), 100000)
+        self.assertEqual(client.outgoing(), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# coding: utf-8
+""" Name/value header blocks: lazy decoding of received blocks, and the
+    LRU cache of serialized ones """
+import unittest
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import HeaderBlock, HeaderBlockCache, SynStream, SynReply, \
+                        SpdyProtocolError, FLAG_FIN
+
+REQUEST = {':method': 'GET', ':path': '/index.html', ':version': 'HTTP/1.1',
+           'user-agent': u'caf\xe9'}
+
+
+class HeaderBlockTest(unittest.TestCase):
+
+    def test_get(self):
+        for version in (2, 3):
+            block = HeaderBlock.from_dict(REQUEST, version)
+            self.assertEqual(block.get(':path'), '/index.html')
+            self.assertEqual(block.get('user-agent'), u'caf\xe9')
+            self.assertIsNone(block.get(':pat'))
+            self.assertEqual(block.get('missing', 'default'), 'default')
+            self.assertEqual(block.to_dict(), REQUEST)
+
+    def test_empty_names_and_values_skipped(self):
+        block = HeaderBlock.from_dict({'': 'x', 'a': '', 'b': 'c'}, 3)
+        self.assertEqual(block.to_dict(), {'b': 'c'})
+
+    def test_duplicate_name(self):
+        block = HeaderBlock.from_dict({'a': 'b'}, 3)
+        #two pairs, the same one twice
+        block = HeaderBlock(b'\0\0\0\2' + block.data[4:] * 2, 3)
+        self.assertEqual(block.get('a'), 'b')
+        self.assertRaises(SpdyProtocolError, block.to_dict)
+
+    def test_truncated(self):
+        data = HeaderBlock.from_dict(REQUEST, 3).data
+        for size in (2, 6, len(data) - 1):
+            block = HeaderBlock(data[:size], 3)
+            self.assertRaises(SpdyProtocolError, block.to_dict)
+            self.assertRaises(SpdyProtocolError, block.get, 'missing')
+
+
+class NameValueFrameTest(unittest.TestCase):
+
+    def receive(self, frame):
+        client = Context(CLIENT, version=3)
+        server = Context(SERVER, version=3)
+        client.put_frame(frame)
+        server.incoming(client.outgoing())
+        return server.get_frame()
+
+    def test_received_headers_decoded_on_access(self):
+        frame = self.receive(SynStream(1, REQUEST, flags=FLAG_FIN, version=3))
+        self.assertIsInstance(frame.raw_headers, HeaderBlock)
+        self.assertEqual(frame.get_header(':method'), 'GET')
+        #get_header() decodes nothing for good
+        self.assertIsInstance(frame.raw_headers, HeaderBlock)
+        self.assertEqual(frame.headers, REQUEST)
+        self.assertIs(frame.raw_headers, frame.headers)
+        self.assertEqual(frame.get_header(':method'), 'GET')
+
+    def test_dict_headers(self):
+        frame = SynReply(1, {':status': '200 OK'}, version=3)
+        self.assertIs(frame.raw_headers, frame.headers)
+        self.assertEqual(frame.get_header(':status'), '200 OK')
+        self.assertIsNone(frame.get_header(':version'))
+
+    def test_block_given_to_frames(self):
+        #a HeaderBlock goes out as it is, or re-serialized for another version
+        block = HeaderBlock.from_dict(REQUEST, 3)
+        for version in (2, 3):
+            client = Context(CLIENT, version=version)
+            server = Context(SERVER, version=version)
+            client.put_frame(SynStream(1, block, flags=FLAG_FIN, version=version))
+            server.incoming(client.outgoing())
+            self.assertEqual(server.get_frame().headers, REQUEST)
+
+
+class HeaderBlockCacheTest(unittest.TestCase):
+
+    def test_hit(self):
+        cache = HeaderBlockCache()
+        block = cache.get(REQUEST)
+        self.assertIs(cache.get(dict(REQUEST)), block)
+        self.assertEqual(block.to_dict(), REQUEST)
+        #one block per version
+        self.assertIsNot(cache.get(REQUEST, 2), block)
+        self.assertEqual(len(cache), 2)
+
+    def test_lru_eviction(self):
+        cache = HeaderBlockCache(maxsize=2)
+        first = cache.get({'n': '1'})
+        second = cache.get({'n': '2'})
+        #using the first one makes the second the least recently used
+        self.assertIs(cache.get({'n': '1'}), first)
+        cache.get({'n': '3'})
+        self.assertEqual(len(cache), 2)
+        self.assertIs(cache.get({'n': '1'}), first)
+        self.assertIsNot(cache.get({'n': '2'}), second)
+        self.assertEqual(len(cache), 2)
+
+    def test_maxsize_one(self):
+        cache = HeaderBlockCache(maxsize=1)
+        first = cache.get({'n': '1'})
+        self.assertIs(cache.get({'n': '1'}), first)
+        cache.get({'n': '2'})
+        self.assertIsNot(cache.get({'n': '1'}), first)
+        self.assertEqual(len(cache), 1)
+
+    def test_empty_cache_rejected(self):
+        self.assertRaises(ValueError, HeaderBlockCache, 0)
+        self.assertRaises(ValueError, HeaderBlockCache, -1)
+
+    def test_clear(self):
+        cache = HeaderBlockCache()
+        cache.get(REQUEST)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_shared_by_contexts(self):
+        cache = HeaderBlockCache()
+        for _ in range(2):
+            client = Context(CLIENT, version=3, header_cache=cache)
+            server = Context(SERVER, version=3)
+            client.put_frame(SynStream(1, REQUEST, flags=FLAG_FIN, version=3))
+            server.incoming(client.outgoing())
+            self.assertEqual(server.get_frame().headers, REQUEST)
+        self.assertEqual(len(cache), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
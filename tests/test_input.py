@@ -0,0 +1,81 @@
+# coding: utf-8
+""" Draining the input buffer of a Context: get_frame(), iter_frames() and
+    get_frames() """
+import unittest
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, Ping, SpdyProtocolError, FLAG_FIN
+
+#a PING with version 2 in a SPDY/3 session
+BAD_FRAME = b'\x80\x02\x00\x06\x00\x00\x00\x04\x00\x00\x00\x01'
+
+def requests(count):
+    """ Encoded SYN_STREAMs opening streams 1, 3, 5... """
+    client = Context(CLIENT, version=3)
+    for i in range(count):
+        client.put_frame(SynStream(client.next_stream_id, {':path': '/%d' % i},
+                                   flags=FLAG_FIN, version=3))
+    return bytes(client.outgoing())
+
+
+class InputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Context(SERVER, version=3)
+
+    def test_streams_updated_as_frames_are_yielded(self):
+        self.server.incoming(requests(3))
+        for frame in self.server.iter_frames():
+            self.assertEqual(max(self.server.streams), frame.stream_id)
+
+    def test_iter_frames_stopped_early(self):
+        data = requests(4)
+        three = len(requests(3))
+        self.server.incoming(data[:three])
+        for frame in self.server.iter_frames():
+            break
+        self.assertEqual(list(self.server.streams), [1])
+        #the rest of the batch comes first, before the new data
+        self.server.incoming(data[three:-1])
+        self.assertEqual(self.server.get_frame().stream_id, 3)
+        self.assertEqual([frame.stream_id for frame in self.server.get_frames()], [5])
+        self.assertEqual(self.server.bytes_pending, len(data) - three - 1)
+        self.server.incoming(data[-1:])
+        self.assertEqual(self.server.get_frame().stream_id, 7)
+
+    def test_protocol_error_after_frames(self):
+        ping = Context(CLIENT, version=3)._encode_frame(Ping(1, version=3))
+        self.server.incoming(requests(2) + BAD_FRAME + ping)
+        frames = self.server.iter_frames()
+        self.assertEqual([next(frames).stream_id, next(frames).stream_id], [1, 3])
+        self.assertRaises(SpdyProtocolError, next, frames)
+        #the invalid frame stays in the buffer
+        try:
+            self.server.get_frames()
+        except SpdyProtocolError as exc:
+            self.assertEqual(exc.frames, [])
+        else:
+            self.fail('SpdyProtocolError not raised')
+        self.assertRaises(SpdyProtocolError, self.server.get_frame)
+
+    def test_get_frames_keeps_frames_before_error(self):
+        self.server.incoming(requests(2) + BAD_FRAME)
+        try:
+            self.server.get_frames()
+        except SpdyProtocolError as exc:
+            self.assertEqual([frame.stream_id for frame in exc.frames], [1, 3])
+        else:
+            self.fail('SpdyProtocolError not raised')
+        self.assertEqual(sorted(self.server.streams), [1, 3])
+
+    def test_partial_frame(self):
+        data = requests(1)
+        self.server.incoming(data[:-1])
+        self.assertEqual(self.server.get_frames(), [])
+        self.assertIsNone(self.server.get_frame())
+        self.server.incoming(data[-1:])
+        self.assertEqual(self.server.get_frame().stream_id, 1)
+        self.assertEqual(self.server.bytes_pending, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
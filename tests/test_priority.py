@@ -0,0 +1,114 @@
+# coding: utf-8
+""" Outgoing frame order in Context: control frames first, DATA by stream
+    priority and in turns, and byte budgets """
+import unittest
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, SynReply, Headers, DataFrame, Ping, FLAG_FIN
+
+REQUEST = {':method': 'GET', ':path': '/', ':version': 'HTTP/1.1'}
+
+def server_with_streams(priorities, **options):
+    """ Returns a SPDY/3 server Context and the ids of the streams a client
+        opened on it, one for each priority """
+    client = Context(CLIENT, version=3)
+    server = Context(SERVER, version=3, **options)
+    stream_ids = []
+    for priority in priorities:
+        stream_id = client.next_stream_id
+        client.put_frame(SynStream(stream_id, REQUEST, priority=priority, flags=FLAG_FIN,
+                                   version=3))
+        stream_ids.append(stream_id)
+    server.incoming(client.outgoing())
+    server.get_frames()
+    return server, stream_ids
+
+def summary(frames):
+    """ (type, stream id, payload size, FIN) for every frame """
+    return [(type(frame).__name__, getattr(frame, 'stream_id', None),
+             len(frame.data) if not frame.is_control else None,
+             bool(frame.flags & FLAG_FIN))
+            for frame in frames]
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def test_control_frames_first(self):
+        server, (stream_id,) = server_with_streams([0])
+        server.put_frame(SynReply(stream_id, {':status': '200'}, flags=0, version=3))
+        server.put_frame(DataFrame(stream_id, b'x' * 10, FLAG_FIN))
+        server.put_frame(Ping(2, version=3))
+        self.assertEqual([name for name, _, _, _ in summary(server._scheduled_frames())],
+                         ['SynReply', 'Ping', 'DataFrame'])
+
+    def test_priority_order(self):
+        server, (low, high) = server_with_streams([3, 0])
+        server.put_frame(DataFrame(low, b'x' * 10, FLAG_FIN))
+        server.put_frame(DataFrame(high, b'x' * 10, FLAG_FIN))
+        self.assertEqual([stream_id for _, stream_id, _, _ in summary(server._scheduled_frames())],
+                         [high, low])
+
+    def test_round_robin_within_priority(self):
+        server, (first, second) = server_with_streams([2, 2], max_frame_size=100)
+        server.put_frame(DataFrame(first, b'x' * 300, FLAG_FIN))
+        server.put_frame(DataFrame(second, b'x' * 200, FLAG_FIN))
+        self.assertEqual([(stream_id, fin) for _, stream_id, _, fin
+                          in summary(server._scheduled_frames())],
+                         [(first, False), (second, False), (first, False), (second, True),
+                          (first, True)])
+
+    def test_max_bytes_budget(self):
+        server, (first, second) = server_with_streams([0, 0], max_frame_size=100)
+        server.put_frame(DataFrame(first, b'x' * 200, FLAG_FIN))
+        server.put_frame(DataFrame(second, b'x' * 200, FLAG_FIN))
+        server.put_frame(Ping(2, version=3))
+        #control frames aren't held back, DATA stops once the budget is spent
+        frames = summary(server._scheduled_frames(max_bytes=150))
+        self.assertEqual(frames, [('Ping', None, None, False),
+                                  ('DataFrame', first, 100, False),
+                                  ('DataFrame', second, 100, False)])
+        #the rest comes next time, in turn
+        self.assertEqual(summary(server._scheduled_frames()),
+                         [('DataFrame', first, 100, True),
+                          ('DataFrame', second, 100, True)])
+        self.assertEqual(server.streams, {})
+
+    def test_zero_budget_sends_control_frames_only(self):
+        server, (stream_id,) = server_with_streams([0])
+        server.put_frame(DataFrame(stream_id, b'x' * 10, FLAG_FIN))
+        server.put_frame(Ping(2, version=3))
+        self.assertEqual([name for name, _, _, _ in summary(server._scheduled_frames(0))],
+                         ['Ping'])
+        self.assertEqual(len(next(server._scheduled_frames()).data), 10)
+
+    def test_headers_do_not_overtake_data(self):
+        server, (stream_id,) = server_with_streams([0])
+        server.put_frame(SynReply(stream_id, {':status': '200'}, flags=0, version=3))
+        server.put_frame(DataFrame(stream_id, b'x' * 100000, 0))
+        server.put_frame(Headers(stream_id, {'x-trailer': 'yes'}, flags=FLAG_FIN, version=3))
+        frames = summary(server._scheduled_frames())
+        #the window lets 64 KiB out, HEADERS waits for the rest
+        self.assertEqual(frames[0][0], 'SynReply')
+        self.assertEqual({name for name, _, _, _ in frames[1:]}, {'DataFrame'})
+        self.assertEqual(sum(size for _, _, size, _ in frames[1:]), 64 * 1024)
+        self.assertIsInstance(server.get_stream(stream_id).pending[-1], Headers)
+
+    def test_headers_without_queued_data_go_right_away(self):
+        server, (stream_id,) = server_with_streams([0])
+        server.put_frame(SynReply(stream_id, {':status': '200'}, flags=0, version=3))
+        server.put_frame(Headers(stream_id, {'x-early': 'yes'}, version=3))
+        self.assertEqual([name for name, _, _, _ in summary(server.frame_queue)],
+                         ['SynReply', 'Headers'])
+
+    def test_headers_after_data_in_order(self):
+        server, (stream_id,) = server_with_streams([0], max_frame_size=100)
+        server.put_frame(DataFrame(stream_id, b'x' * 150, 0))
+        server.put_frame(Headers(stream_id, {'x-trailer': 'yes'}, flags=FLAG_FIN, version=3))
+        self.assertEqual(summary(server._scheduled_frames()),
+                         [('DataFrame', stream_id, 100, False),
+                          ('DataFrame', stream_id, 50, False),
+                          ('Headers', stream_id, None, True)])
+        self.assertIsNone(server.get_stream(stream_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
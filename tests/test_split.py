@@ -0,0 +1,68 @@
+# coding: utf-8
+""" DATA payloads bigger than max_frame_size, split by Context into several
+    frames """
+import unittest
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, DataFrame, FLAG_FIN
+
+REQUEST = {':method': 'GET', ':path': '/', ':version': 'HTTP/1.1'}
+
+def server_with_streams(priorities, **options):
+    """ Returns a SPDY/3 server Context and the ids of the streams a client
+        opened on it, one for each priority """
+    client = Context(CLIENT, version=3)
+    server = Context(SERVER, version=3, **options)
+    stream_ids = []
+    for priority in priorities:
+        stream_id = client.next_stream_id
+        client.put_frame(SynStream(stream_id, REQUEST, priority=priority, flags=FLAG_FIN,
+                                   version=3))
+        stream_ids.append(stream_id)
+    server.incoming(client.outgoing())
+    server.get_frames()
+    return server, stream_ids
+
+def summary(frames):
+    """ (type, stream id, payload size, FIN) for every frame """
+    return [(type(frame).__name__, getattr(frame, 'stream_id', None),
+             len(frame.data) if not frame.is_control else None,
+             bool(frame.flags & FLAG_FIN))
+            for frame in frames]
+
+
+class SplitTest(unittest.TestCase):
+
+    def test_split_data_frame(self):
+        server = Context(SERVER, version=3)
+        head, rest = server._split_data_frame(DataFrame(1, b'abcdef', FLAG_FIN), 4)
+        self.assertEqual((bytes(head.data), head.flags), (b'abcd', 0))
+        self.assertEqual((bytes(rest.data), rest.flags), (b'ef', FLAG_FIN))
+
+    def test_fin_on_last_frame_only(self):
+        server, (stream_id,) = server_with_streams([0], max_frame_size=1000)
+        server.put_frame(DataFrame(stream_id, b'x' * 2500, FLAG_FIN))
+        self.assertEqual(summary(server._scheduled_frames()),
+                         [('DataFrame', stream_id, 1000, False),
+                          ('DataFrame', stream_id, 1000, False),
+                          ('DataFrame', stream_id, 500, True)])
+
+    def test_fin_on_last_frame_only_without_stream(self):
+        #DATA for a stream the Context doesn't know goes to the control queue
+        server = Context(SERVER, version=3, max_frame_size=1000)
+        server.put_frame(DataFrame(3, b'x' * 2500, FLAG_FIN))
+        self.assertEqual([(size, fin) for _, _, size, fin in summary(server._scheduled_frames())],
+                         [(1000, False), (1000, False), (500, True)])
+
+    def test_no_split_at_max_frame_size(self):
+        server, (stream_id,) = server_with_streams([0], max_frame_size=1000)
+        server.put_frame(DataFrame(stream_id, b'x' * 1000, FLAG_FIN))
+        self.assertEqual(summary(server._scheduled_frames()),
+                         [('DataFrame', stream_id, 1000, True)])
+
+    def test_invalid_max_frame_size(self):
+        self.assertRaises(ValueError, Context, SERVER, max_frame_size=0)
+        self.assertRaises(ValueError, Context, SERVER, max_frame_size=1 << 24)
+
+
+if __name__ == '__main__':
+    unittest.main()
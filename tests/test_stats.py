@@ -0,0 +1,76 @@
+# coding: utf-8
+""" Context counters: frames and bytes by frame type, header compression,
+    and the totals of the process """
+import gc
+import unittest
+import spdy.stats
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, SynReply, DataFrame, Ping, FLAG_FIN
+
+REQUEST = {':method': 'GET', ':path': '/', ':version': 'HTTP/1.1'}
+
+def session():
+    """ A client and a server Context after a request and its response """
+    client = Context(CLIENT, version=3)
+    server = Context(SERVER, version=3)
+    stream_id = client.next_stream_id
+    client.put_frame(SynStream(stream_id, REQUEST, flags=FLAG_FIN, version=3))
+    client.put_frame(Ping(1, version=3))
+    server.incoming(client.outgoing())
+    server.get_frames()
+    server.put_frame(SynReply(stream_id, {':status': '200 OK'}, flags=0, version=3))
+    server.put_frame(DataFrame(stream_id, b'x' * 1000, FLAG_FIN))
+    client.incoming(server.outgoing())
+    client.get_frames()
+    return client, server
+
+
+class StatsTest(unittest.TestCase):
+
+    def test_frames(self):
+        client, server = session()
+        stats = server.stats()
+        self.assertEqual(stats['frames_in']['SynStream'], 1)
+        self.assertEqual(stats['frames_in']['Ping'], 1)
+        self.assertEqual(stats['frames_in']['DataFrame'], 0)
+        self.assertEqual(stats['frames_out']['SynReply'], 1)
+        self.assertEqual(stats['frames_out']['DataFrame'], 1)
+        self.assertEqual(stats['frames_in'], client.stats()['frames_out'])
+        self.assertEqual(stats['frames_out'], client.stats()['frames_in'])
+        #no NOOP class, no NOOP counter
+        self.assertEqual(set(stats['frames_in']),
+                         set(['DataFrame', 'SynStream', 'SynReply', 'RstStream', 'Settings',
+                              'Ping', 'Goaway', 'Headers', 'WindowUpdate']))
+
+    def test_bytes(self):
+        client, server = session()
+        stats = server.stats()
+        self.assertEqual(stats['data_bytes_out'], 1000)
+        self.assertEqual(stats['frame_bytes_out']['DataFrame'], 1008)
+        self.assertEqual(stats['frame_bytes_in']['Ping'], 12)
+        self.assertEqual(stats['bytes_in'], sum(stats['frame_bytes_in'].values()))
+        self.assertEqual(stats['bytes_out'], client.stats()['bytes_in'])
+        self.assertTrue(0 < stats['header_bytes_in'] < stats['header_raw_bytes_in'])
+        self.assertEqual(stats['header_bytes_in'], client.stats()['header_bytes_out'])
+
+    def test_outgoing_segments(self):
+        server = Context(SERVER, version=3)
+        server.put_frame(Ping(2, version=3))
+        server.put_frame(DataFrame(1, b'x' * 10, FLAG_FIN))
+        length = sum(len(segment) for segment in server.outgoing_segments())
+        stats = server.stats()
+        self.assertEqual(stats['bytes_out'], length)
+        self.assertEqual((stats['frames_out']['Ping'], stats['frames_out']['DataFrame']),
+                         (1, 1))
+
+    def test_totals_keep_gone_contexts(self):
+        before = spdy.stats.totals()['frames_in']['SynStream']
+        client, server = session()
+        self.assertEqual(spdy.stats.totals()['frames_in']['SynStream'], before + 1)
+        del client, server
+        gc.collect()
+        self.assertEqual(spdy.stats.totals()['frames_in']['SynStream'], before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
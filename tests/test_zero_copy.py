@@ -0,0 +1,68 @@
+# coding: utf-8
+""" zero_copy DataFrames: memoryviews into the input buffer of a Context,
+    which must stay valid while the buffer is compacted and refilled """
+import unittest
+from spdy.context import Context, CLIENT, SERVER
+from spdy.frames import SynStream, DataFrame, FLAG_FIN
+
+REQUEST = {':method': 'GET', ':path': '/', ':version': 'HTTP/1.1'}
+
+
+class ZeroCopyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Context(CLIENT, version=3)
+        self.server = Context(SERVER, version=3, zero_copy=True, auto_consume=False)
+        self.stream_id = self.client.next_stream_id
+        self.client.put_frame(SynStream(self.stream_id, REQUEST, flags=0, version=3))
+        self.server.incoming(self.client.outgoing())
+        self.server.get_frames()
+
+    def send(self, data, flags=0):
+        self.client.put_frame(DataFrame(self.stream_id, data, flags))
+        return self.client.outgoing()
+
+    def test_data_is_a_view(self):
+        self.server.incoming(self.send(b'hello'))
+        frame, = self.server.get_frames()
+        self.assertIsInstance(frame.data, memoryview)
+        self.assertEqual(bytes(frame.data), b'hello')
+
+    def test_valid_after_compaction(self):
+        #a frame and a half: the partial one stays in the buffer
+        chunk = self.send(b'first') + self.send(b'second')
+        self.server.incoming(chunk[:-3])
+        first, = self.server.get_frames()
+        self.assertEqual(self.server.bytes_pending, 8 + len(b'second') - 3)
+
+        #compacting can't move the bytes under the view, the buffer is replaced
+        self.server._compact_input()
+        self.server.incoming(chunk[-3:])
+        second, = self.server.get_frames()
+        self.assertEqual(bytes(first.data), b'first')
+        self.assertEqual(bytes(second.data), b'second')
+
+    def test_valid_after_buffer_reuse(self):
+        #the whole buffer was parsed, then refilled
+        self.server.incoming(self.send(b'first'))
+        first, = self.server.get_frames()
+        self.server.incoming(self.send(b'x' * 1000))
+        self.server.incoming(self.send(b'last', FLAG_FIN))
+        rest = self.server.get_frames()
+        self.assertEqual(bytes(first.data), b'first')
+        self.assertEqual([bytes(frame.data) for frame in rest], [b'x' * 1000, b'last'])
+
+    def test_release(self):
+        self.server.incoming(self.send(b'first'))
+        first, = self.server.get_frames()
+        first.release()
+        self.assertRaises(ValueError, bytes, first.data)
+        #nothing points into the buffer anymore, it's emptied in place
+        buffer = self.server.input_buffer
+        self.server.incoming(self.send(b'second'))
+        self.assertIs(self.server.input_buffer, buffer)
+        self.assertEqual(bytes(self.server.get_frame().data), b'second')
+
+
+if __name__ == '__main__':
+    unittest.main()